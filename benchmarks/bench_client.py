@@ -0,0 +1,146 @@
+"""Throughput, latency percentiles and peak memory of the client's main calls.
+
+Starts a FakeBitbucketServer in-process and runs each scenario against it::
+
+    python benchmarks/bench_client.py --projects 10 --repos 10 --prs 300 --latency 0.005
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+    import resource
+
+from bitbucket import Bitbucket
+from bitbucket.resources import PullRequest, dict2resource
+from bitbucket.retry import RetryPolicy
+from fakeserver import FakeBitbucketConfig, FakeBitbucketServer
+import payloads
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+class Measurement(object):
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.elapsed = 0.0
+        self.peak = 0
+
+    def report(self):
+        calls = len(self.latencies)
+        print('%-22s %7d %9.3f %10.1f %9.2f %9.2f %9.2f %9.1f' % (
+            self.name, calls, self.elapsed, calls / self.elapsed if self.elapsed else 0,
+            percentile(self.latencies, 50) * 1000, percentile(self.latencies, 95) * 1000,
+            percentile(self.latencies, 99) * 1000, self.peak / 1024.0 / 1024.0))
+
+
+def measure(name, calls):
+    """Run every callable in ``calls``, timing each one."""
+    result = Measurement(name)
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    started = time.time()
+    for call in calls:
+        t = time.time()
+        call()
+        result.latencies.append(time.time() - t)
+    result.elapsed = time.time() - started
+    if tracemalloc is not None:
+        result.peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        # Process high-water mark (KiB on Linux); only grows across scenarios.
+        result.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+def client_for(server, **options):
+    retry_policy = RetryPolicy(base_delay=0.01, max_delay=0.5)
+    return Bitbucket(server.url, options=options, basic_auth=('admin', 'admin'),
+                     retry_policy=retry_policy)
+
+
+def run(args):
+    config = FakeBitbucketConfig(projects=args.projects, repos_per_project=args.repos,
+                                 prs_per_repo=args.prs, description_size=args.payload_bytes,
+                                 message_size=args.payload_bytes, latency=args.latency)
+    server = FakeBitbucketServer(config).start()
+    results = []
+    try:
+        client = client_for(server)
+        results.append(measure('Bitbucket.projects',
+                               [client.projects for _ in range(args.repeat)]))
+
+        projects = client.projects()
+        results.append(measure('Project.repos', [project.repos for project in projects]))
+
+        repos = [repo for project in projects[:2] for repo in project.repos()][:args.sample]
+        results.append(measure('Repo.pull_requests',
+                               [lambda repo=repo: repo.pull_requests(state='ALL', limit=1000)
+                                for repo in repos]))
+
+        prs = repos[0].pull_requests(state='ALL', limit=1000)[:args.sample]
+        results.append(measure('PullRequest.can_merge', [pr.can_merge for pr in prs]))
+        results.append(measure('Repo.can_merge_many',
+                               [lambda: client_for(server).project(projects[0].key)
+                                .repo(repos[0].slug).can_merge_many(prs)]))
+
+        raws = [payloads.pull_request(i, description_size=args.payload_bytes)
+                for i in range(1, args.prs + 1)]
+        options = client._options
+        results.append(measure('dict2resource',
+                               [lambda raw=raw: dict2resource(raw, None, options, None)
+                                for raw in raws]))
+        results.append(measure('PullRequest(raw)',
+                               [lambda raw=raw: PullRequest(options, None, raw) for raw in raws]))
+    finally:
+        server.stop()
+
+    config = FakeBitbucketConfig(projects=args.projects, repos_per_project=args.repos,
+                                 prs_per_repo=args.prs, latency=args.latency,
+                                 error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    server = FakeBitbucketServer(config).start()
+    try:
+        client = client_for(server)
+        result = measure('retries (429/503)', [client.projects for _ in range(args.repeat)])
+        result.name = 'retries (%d retried)' % client._session.retry_policy.stats()['retries']
+        results.append(result)
+    finally:
+        server.stop()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--projects', type=int, default=10)
+    parser.add_argument('--repos', type=int, default=10)
+    parser.add_argument('--prs', type=int, default=300)
+    parser.add_argument('--payload-bytes', type=int, default=128)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--throttle-rate', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--sample', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print('%-22s %7s %9s %10s %9s %9s %9s %9s' % (
+        'scenario', 'calls', 'total s', 'calls/s', 'p50 ms', 'p95 ms', 'p99 ms', 'peak MB'))
+    for result in run(args):
+        result.report()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
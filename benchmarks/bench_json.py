@@ -0,0 +1,33 @@
+"""Compare the installed JSON backends on Bitbucket shaped payloads.
+
+Run from the repository root::
+
+    python benchmarks/bench_json.py [page_size] [repeat]
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+
+from bitbucket import jsoncodec
+from payloads import commit, page, pull_request
+
+
+def main(page_size=1000, repeat=5):
+    stdlib = jsoncodec.get_backend('json')
+    documents = [
+        ('pull-requests page', stdlib.dumps(page([pull_request(i) for i in range(page_size)]))),
+        ('commits page', stdlib.dumps(page([commit(i) for i in range(page_size)]))),
+    ]
+    print('%-20s %-8s %12s %12s' % ('payload', 'backend', 'loads ms', 'dumps ms'))
+    for label, text in documents:
+        data = stdlib.loads(text)
+        for backend in jsoncodec.available_backends():
+            loads = min(timeit.repeat(lambda: backend.loads(text), number=1, repeat=repeat))
+            dumps = min(timeit.repeat(lambda: backend.dumps(data), number=1, repeat=repeat))
+            print('%-20s %-8s %12.2f %12.2f' % (label, backend.name, loads * 1000, dumps * 1000))
+        print('%-20s %d bytes' % ('', len(text)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,62 @@
+"""Report memory used per object by full resources and compact records.
+
+Run from the repository root::
+
+    python benchmarks/bench_records.py [count]
+"""
+from __future__ import print_function
+
+import sys
+
+from bitbucket.resources import Commit, CommitRecord, PullRequest, PullRequestRecord
+from payloads import commit, pull_request
+
+OPTIONS = {'server': 'http://localhost:7990', 'rest_path': 'api',
+           'rest_api_version': '1.0', 'headers': {}}
+LAZY_OPTIONS = dict(OPTIONS, lazy_resources=True)
+LISTING = 'http://localhost:7990/rest/api/1.0/projects/PRJ/repos/repo/'
+
+
+def deep_size(obj, seen=None):
+    """Approximate bytes reachable from obj, not counting shared objects twice."""
+    if seen is None:
+        seen = set([id(OPTIONS), id(LAZY_OPTIONS), id(None)])
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_size(item, seen)
+    if hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if hasattr(obj, name):
+                size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+def report(label, objects):
+    seen = set([id(OPTIONS), id(LAZY_OPTIONS), id(None)])
+    total = sum(deep_size(obj, seen) for obj in objects)
+    print('%-20s %10d bytes/object' % (label, total // len(objects)))
+
+
+def main(count=1000):
+    raw_prs = [pull_request(i) for i in range(1, count + 1)]
+    raw_commits = [commit(i) for i in range(1, count + 1)]
+    report('PullRequest', [PullRequest(OPTIONS, None, raw) for raw in raw_prs])
+    report('PullRequest (lazy)', [PullRequest(LAZY_OPTIONS, None, raw) for raw in raw_prs])
+    report('PullRequestRecord', [PullRequestRecord.from_raw(OPTIONS, None, LISTING + 'pull-requests', raw)
+                                 for raw in raw_prs])
+    report('Commit', [Commit(OPTIONS, None, raw) for raw in raw_commits])
+    report('CommitRecord', [CommitRecord.from_raw(OPTIONS, None, LISTING + 'commits', raw)
+                            for raw in raw_commits])
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,84 @@
+"""Benchmark the client's parsing and merge-check paths on recorded traffic.
+
+Records a session against a FakeBitbucketServer (or uses ``--archive``, e.g.
+one recorded against a real server with ``TrafficRecorder``) and replays it
+without any network::
+
+    python benchmarks/bench_replay.py --prs 500 --repeat 5
+    python benchmarks/bench_replay.py --archive prod.rec
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import tempfile
+
+from bitbucket import Bitbucket
+from bitbucket.recording import TrafficRecorder, TrafficReplayer
+from bench_client import measure
+from fakeserver import FakeBitbucketConfig, FakeBitbucketServer
+
+
+def workload(client, sample):
+    """The calls being profiled; the recording must cover all of them."""
+    for repo in client.iter_all_repos():
+        prs = repo.pull_requests(state='ALL', limit=1000)
+        repo.can_merge_many(prs[:sample])
+        for pr in prs[:sample]:
+            pr.can_merge()
+
+
+def record(path, args):
+    config = FakeBitbucketConfig(projects=args.projects, repos_per_project=args.repos,
+                                 prs_per_repo=args.prs, latency=args.latency)
+    server = FakeBitbucketServer(config).start()
+    try:
+        client = Bitbucket(server.url, basic_auth=('admin', 'admin'),
+                           recorder=TrafficRecorder(path))
+        result = measure('live (recording)', [lambda: workload(client, args.sample)])
+        client.close()
+    finally:
+        server.stop()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--archive', help='replay this archive instead of recording one')
+    parser.add_argument('--projects', type=int, default=4)
+    parser.add_argument('--repos', type=int, default=5)
+    parser.add_argument('--prs', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--sample', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = []
+    path = args.archive
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.rec', prefix='bitbucket-bench-')
+        os.close(fd)
+        results.append(record(path, args))
+
+    for name, scale in (('replay', 0.0), ('replay (timed)', 1.0)):
+        def run(scale=scale):
+            # A fresh client per run, so nothing is served from earlier runs' state.
+            # Archives are keyed by path, so any base url replays them.
+            client = Bitbucket('http://replay', basic_auth=('admin', 'admin'),
+                               replayer=TrafficReplayer(path, latency_scale=scale))
+            workload(client, args.sample)
+        repeat = args.repeat if not scale else 1
+        results.append(measure(name, [run] * repeat))
+
+    print('%-22s %7s %9s %10s %9s %9s %9s %9s' % (
+        'scenario', 'calls', 'total s', 'calls/s', 'p50 ms', 'p95 ms', 'p99 ms', 'peak MB'))
+    for result in results:
+        result.report()
+    if args.archive is None:
+        os.remove(path)
+        os.remove(path + '.idx')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
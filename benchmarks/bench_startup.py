@@ -0,0 +1,74 @@
+"""Per-invocation overhead: import time, client construction and first request.
+
+Every sample is a fresh interpreter, as for a git hook or CI step::
+
+    python benchmarks/bench_startup.py --runs 20
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from fakeserver import FakeBitbucketServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+CHILD = '''
+import json, sys, time
+before = set(name for name, module in sys.modules.items() if module)
+started = time.time()
+from bitbucket import Bitbucket
+imported = time.time()
+modules = [name for name, module in sys.modules.items() if module and name not in before]
+heavy = sorted(name for name in ('requests', 'six', 'tempfile', 'sqlite3', 'multiprocessing')
+               if name in sys.modules)
+timings = {'import': imported - started, 'modules': len(modules), 'heavy': heavy}
+if len(sys.argv) > 1:
+    client = Bitbucket(sys.argv[1], basic_auth=('admin', 'admin'))
+    constructed = time.time()
+    client.project('PRJ0').repo('repo0').pull_request(1)
+    timings['construct'] = constructed - imported
+    timings['first_request'] = time.time() - constructed
+print(json.dumps(timings))
+'''
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2] if ordered else 0.0
+
+
+def sample(args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    output = subprocess.check_output([sys.executable, '-c', CHILD] + args, env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    imports = [sample([]) for _ in range(args.runs)]
+    print('import bitbucket          %8.1f ms  (%d modules; heavy: %s)' % (
+        median([s['import'] for s in imports]) * 1000, imports[-1]['modules'],
+        ', '.join(imports[-1]['heavy']) or 'none'))
+
+    server = FakeBitbucketServer().start()
+    try:
+        runs = [sample([server.url]) for _ in range(args.runs)]
+    finally:
+        server.stop()
+    for key, label in (('import', 'import'), ('construct', 'Bitbucket()'),
+                       ('first_request', 'first 3 requests')):
+        print('%-25s %8.1f ms' % (label, median([s[key] for s in runs]) * 1000))
+    print('%-25s %8.1f ms' % ('total', median(
+        [s['import'] + s['construct'] + s['first_request'] for s in runs]) * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,233 @@
+"""A local stand-in for the Bitbucket Server REST API used by the benchmarks.
+
+Serves projects, repos, pull requests, commits and the merge endpoints from
+generated data, with configurable sizes, latency and injected failures::
+
+    python benchmarks/fakeserver.py --port 7990 --projects 20 --latency 0.01
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+import payloads
+
+
+class FakeBitbucketConfig(object):
+    def __init__(self,
+                 projects=10,
+                 repos_per_project=10,
+                 prs_per_repo=100,
+                 merges_per_repo=None,
+                 description_size=128,
+                 message_size=0,
+                 max_limit=1000,
+                 latency=0.0,
+                 error_rate=0.0,
+                 throttle_rate=0.0,
+                 retry_after=0,
+                 seed=0,
+                 ):
+        self.projects = projects
+        self.repos_per_project = repos_per_project
+        self.prs_per_repo = prs_per_repo
+        self.merges_per_repo = prs_per_repo if merges_per_repo is None else merges_per_repo
+        self.description_size = description_size
+        self.message_size = message_size
+        self.max_limit = max_limit
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+
+API = '/rest/api/1.0'
+ROUTES = [
+    (re.compile(r'^/projects$'), 'projects'),
+    (re.compile(r'^/projects/([^/]+)$'), 'project'),
+    (re.compile(r'^/projects/([^/]+)/repos$'), 'repos'),
+    (re.compile(r'^/projects/([^/]+)/repos/([^/]+)$'), 'repo'),
+    (re.compile(r'^/projects/([^/]+)/repos/([^/]+)/pull-requests$'), 'pull_requests'),
+    (re.compile(r'^/projects/([^/]+)/repos/([^/]+)/pull-requests/(\d+)$'), 'pull_request'),
+    (re.compile(r'^/projects/([^/]+)/repos/([^/]+)/pull-requests/(\d+)/merge$'), 'merge'),
+    (re.compile(r'^/projects/([^/]+)/repos/([^/]+)/commits$'), 'commits'),
+    (re.compile(r'^/projects/([^/]+)/repos/([^/]+)/commits/([^/]+)$'), 'commit'),
+]
+
+
+class FakeBitbucketHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment; avoids delayed-ACK stalls on keep-alive.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, verb):
+        self.server.count(verb)
+        config = self.config
+        if config.latency:
+            time.sleep(config.latency)
+        roll = config.random.random()
+        if roll < config.throttle_rate:
+            return self._send(429, {'errors': [{'message': 'Rate limit exceeded'}]},
+                              {'Retry-After': str(config.retry_after)})
+        if roll < config.throttle_rate + config.error_rate:
+            return self._send(503, {'errors': [{'message': 'Service unavailable'}]})
+
+        url = urlparse(self.path)
+        if not url.path.startswith(API):
+            return self._send(404, {'errors': [{'message': 'Not found'}]})
+        query = dict((key, values[-1]) for key, values in parse_qs(url.query).items())
+        for pattern, name in ROUTES:
+            match = pattern.match(url.path[len(API):])
+            if match:
+                return getattr(self, 'on_' + name)(verb, query, *match.groups())
+        return self._send(404, {'errors': [{'message': 'Not found'}]})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self._handle('POST')
+
+    def _page(self, query, total, make):
+        start = int(query.get('start', 0))
+        limit = min(int(query.get('limit', 25)), self.config.max_limit)
+        end = min(total, start + limit)
+        values = [make(i) for i in range(start, end)]
+        self._send(200, payloads.page(values, start, limit, last=end >= total))
+
+    def _server(self):
+        return 'http://%s:%d' % self.server.server_address
+
+    def on_projects(self, verb, query):
+        self._page(query, self.config.projects,
+                   lambda i: payloads.project('PRJ%d' % i, i, self._server()))
+
+    def on_project(self, verb, query, key):
+        self._send(200, payloads.project(key, server=self._server()))
+
+    def on_repos(self, verb, query, key):
+        self._page(query, self.config.repos_per_project,
+                   lambda i: payloads.repository('repo%d' % i, key, i, self._server()))
+
+    def on_repo(self, verb, query, key, slug):
+        self._send(200, payloads.repository(slug, key, server=self._server()))
+
+    def _pull_request(self, key, slug, number):
+        # Newest first; every third pull request is still open.
+        state = 'OPEN' if number % 3 == 0 else 'MERGED'
+        return payloads.pull_request(number, slug, key, state, self.config.description_size,
+                                     self._server())
+
+    def on_pull_requests(self, verb, query, key, slug):
+        total = self.config.prs_per_repo
+        self._page(query, total, lambda i: self._pull_request(key, slug, total - i))
+
+    def on_pull_request(self, verb, query, key, slug, number):
+        self._send(200, self._pull_request(key, slug, int(number)))
+
+    def on_merge(self, verb, query, key, slug, number):
+        if verb == 'POST':
+            return self._send(200, payloads.commit(int(number), slug, key))
+        self._send(200, {'canMerge': True, 'conflicted': False, 'outcome': 'CLEAN', 'vetoes': []})
+
+    def on_commits(self, verb, query, key, slug):
+        total = self.config.merges_per_repo
+        self._page(query, total,
+                   lambda i: payloads.commit(total - i, slug, key, self.config.message_size))
+
+    def on_commit(self, verb, query, key, slug, commit_id):
+        # A commit's id is the number of the pull request it merged, in hex.
+        try:
+            number = int(commit_id, 16)
+        except ValueError:
+            number = 0
+        if len(commit_id) != 40 or not 1 <= number <= self.config.merges_per_repo:
+            return self._send(404, {'errors': [{'message': 'Commit %s does not exist' % commit_id}]})
+        self._send(200, payloads.commit(number, slug, key, self.config.message_size))
+
+
+class FakeBitbucketServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        HTTPServer.__init__(self, (host, port), FakeBitbucketHandler)
+        self.config = config or FakeBitbucketConfig()
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def count(self, verb):
+        with self._lock:
+            self.requests[verb] = self.requests.get(verb, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=7990)
+    parser.add_argument('--projects', type=int, default=10)
+    parser.add_argument('--repos', type=int, default=10)
+    parser.add_argument('--prs', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    config = FakeBitbucketConfig(projects=args.projects, repos_per_project=args.repos,
+                                 prs_per_repo=args.prs, latency=args.latency,
+                                 error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    server = FakeBitbucketServer(config, port=args.port)
+    print('Serving fake Bitbucket Server on %s' % server.url)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Synthetic Bitbucket Server payloads shaped like real REST responses."""
+
+SERVER = 'http://localhost:7990'
+
+
+def links(server, path):
+    return {'self': [{'href': '%s/%s' % (server, path)}]}
+
+
+def user(i, server=SERVER):
+    return {'name': 'user%d' % i, 'emailAddress': 'user%d@example.com' % i, 'id': i,
+            'displayName': 'User %d' % i, 'active': True, 'slug': 'user%d' % i, 'type': 'NORMAL',
+            'links': links(server, 'users/user%d' % i)}
+
+
+def project(key='PRJ', id=1, server=SERVER):
+    return {'key': key, 'id': id, 'name': key, 'public': False, 'type': 'NORMAL',
+            'links': links(server, 'projects/%s' % key)}
+
+
+def repository(slug='repo', project_key='PRJ', id=1, server=SERVER):
+    return {'slug': slug, 'id': id, 'name': slug, 'state': 'AVAILABLE', 'public': False,
+            'project': project(project_key, server=server),
+            'links': links(server, 'projects/%s/repos/%s/browse' % (project_key, slug))}
+
+
+def pull_request(i, slug='repo', project_key='PRJ', state='MERGED', description_size=128,
+                 server=SERVER):
+    ref = {'id': 'refs/heads/feature-%d' % i, 'displayId': 'feature-%d' % i,
+           'latestCommit': '%040x' % i, 'repository': repository(slug, project_key, server=server)}
+    description = ('Longer description of change %d. ' % i) * (description_size // 32 + 1)
+    return {'id': i, 'version': 3, 'title': 'Change number %d' % i,
+            'description': description[:description_size],
+            'state': state, 'open': state == 'OPEN', 'closed': state != 'OPEN',
+            'createdDate': 1500000000000 + i, 'updatedDate': 1500000100000 + i,
+            'closedDate': 1500000200000 + i, 'fromRef': ref, 'toRef': dict(ref, id='refs/heads/master'),
+            'locked': False, 'author': {'user': user(i, server), 'role': 'AUTHOR', 'approved': False},
+            'reviewers': [{'user': user(i + j, server), 'role': 'REVIEWER', 'approved': True,
+                           'status': 'APPROVED'} for j in range(3)],
+            'participants': [],
+            'links': links(server, 'projects/%s/repos/%s/pull-requests/%d' % (project_key, slug, i))}
+
+
+def commit(i, slug='repo', project_key='PRJ', message_size=0):
+    message = 'Merge pull request #%d in %s/%s from feature-%d to master' % (
+        i, project_key, slug, i)
+    return {'id': '%040x' % i, 'displayId': ('%040x' % i)[:11],
+            'author': {'name': 'user%d' % i, 'emailAddress': 'user%d@example.com' % i},
+            'authorTimestamp': 1500000000000 + i, 'committerTimestamp': 1500000000000 + i,
+            'message': message + '\n\n' + 'x' * message_size if message_size else message,
+            'parents': [{'id': '%040x' % (i - 1), 'displayId': ('%040x' % (i - 1))[:11]}]}
+
+
+def page(values, start=0, limit=None, last=True):
+    body = {'size': len(values), 'limit': limit or len(values), 'start': start,
+            'isLastPage': last, 'values': values}
+    if not last:
+        body['nextPageStart'] = start + len(values)
+    return body
@@ -2,11 +2,13 @@
 from __future__ import unicode_literals
 from bitbucket.resources import Repo
 from bitbucket.client import Bitbucket
+from bitbucket.async_client import AsyncBitbucket
 
 __version__ = '0.0.1'
 
 __all__ = (
     'Repo',
     '__version__',
-    'Bitbucket'
+    'Bitbucket',
+    'AsyncBitbucket'
 )
\ No newline at end of file
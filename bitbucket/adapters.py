@@ -0,0 +1,79 @@
+import socket
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connection import HTTPConnection
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class _PoolStatsMixin(object):
+    waits = 0
+
+    def _get_conn(self, timeout=None):
+        # Every slot is checked out: block (pool_block) or open an overflow connection.
+        if self.pool is not None and self.pool.empty():
+            self.waits += 1
+        return super(_PoolStatsMixin, self)._get_conn(timeout=timeout)
+
+
+class StatsHTTPConnectionPool(_PoolStatsMixin, HTTPConnectionPool):
+    pass
+
+
+class StatsHTTPSConnectionPool(_PoolStatsMixin, HTTPSConnectionPool):
+    pass
+
+
+def keepalive_socket_options(idle=60, interval=10, count=6):
+    """Socket options enabling TCP keep-alive probes after ``idle`` seconds."""
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+    elif hasattr(socket, 'TCP_KEEPALIVE'):  # macOS
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval))
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count))
+    return options
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with TCP keep-alive and connection pool statistics.
+
+    ``pool_connections`` is the number of hosts kept pooled, ``pool_maxsize``
+    the connections kept per host and ``pool_block`` makes callers wait for a
+    free connection instead of opening (and then discarding) extra ones.
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['tcp_keepalive']
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 tcp_keepalive=None, **kwargs):
+        self.tcp_keepalive = tcp_keepalive
+        super(PooledHTTPAdapter, self).__init__(pool_connections=pool_connections,
+                                                pool_maxsize=pool_maxsize,
+                                                pool_block=pool_block, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.tcp_keepalive:
+            pool_kwargs['socket_options'] = keepalive_socket_options(self.tcp_keepalive)
+        super(PooledHTTPAdapter, self).init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': StatsHTTPConnectionPool,
+            'https': StatsHTTPSConnectionPool,
+        }
+
+    def stats(self):
+        stats = {'pools': 0, 'requests': 0, 'new_connections': 0, 'hits': 0, 'waits': 0}
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['pools'] += 1
+            stats['requests'] += pool.num_requests
+            stats['new_connections'] += pool.num_connections
+            stats['waits'] += getattr(pool, 'waits', 0)
+        stats['hits'] = max(0, stats['requests'] - stats['new_connections'])
+        return stats
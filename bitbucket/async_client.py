@@ -0,0 +1,51 @@
+import threading
+
+from bitbucket.client import Bitbucket
+
+
+class AsyncBitbucket(Bitbucket):
+    """Bitbucket client whose calls return futures instead of blocking.
+
+    Every call is queued on a pool of ``max_concurrency`` workers sharing one
+    ResilientSession, and at most ``max_concurrency`` requests are in flight
+    across the client, page prefetches and ``get_many`` or ``crawl_inventory``
+    workers included. Results are ``AsyncResult`` objects: poll ``ready()``,
+    block on ``get()`` or pass ``callback`` to be notified. Retries and their
+    backoff run on the worker, so the caller's thread (or event loop) is never
+    put to sleep; a request waiting to be retried does not count as in flight.
+    """
+
+    def __init__(self, server=None, options=None, basic_auth=None,
+                 max_concurrency=5, **kwargs):
+        kwargs['async_'] = True
+        kwargs['async_workers'] = max_concurrency
+        super(AsyncBitbucket, self).__init__(server, options, basic_auth, **kwargs)
+        self._session.in_flight_limit = threading.BoundedSemaphore(max_concurrency)
+
+    def _submit(self, func, args=(), kwargs=None, callback=None):
+        return self._session.pool.apply_async(func, args, kwargs or {}, callback)
+
+    def find(self, resource_format, ids=None, callback=None):
+        return self._submit(super(AsyncBitbucket, self).find,
+                            (resource_format, ids), callback=callback)
+
+    def project(self, id, callback=None):
+        return self._submit(super(AsyncBitbucket, self).project, (id,), callback=callback)
+
+    def repos(self, project, callback=None, **params):
+        def fetch():
+            return list(project.iter_repos(**params))
+        return self._submit(fetch, callback=callback)
+
+    def pull_requests(self, repo, callback=None, **params):
+        def fetch():
+            if not params:
+                params.update({'state': 'merged', 'limit': 1000})
+            return list(repo.iter_pull_requests(**params))
+        return self._submit(fetch, callback=callback)
+
+    def can_merge(self, pull_request, callback=None, **params):
+        return self._submit(pull_request.can_merge, kwargs=params, callback=callback)
+
+    def merge(self, pull_request, callback=None):
+        return self._submit(pull_request.merge, callback=callback)
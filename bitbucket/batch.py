@@ -0,0 +1,73 @@
+from multiprocessing.pool import ThreadPool
+
+from bitbucket.resources import find_resource
+
+
+class BatchResult(object):
+    """Outcome of one ``(resource_cls, ids)`` reference of a batch.
+
+    ``index`` is the reference's position in the batch; exactly one of
+    ``resource`` and ``error`` is set.
+    """
+    __slots__ = ('index', 'resource_cls', 'ids', 'resource', 'error')
+
+    def __init__(self, index, resource_cls, ids, resource=None, error=None):
+        self.index = index
+        self.resource_cls = resource_cls
+        self.ids = ids
+        self.resource = resource
+        self.error = error
+
+    def __repr__(self):
+        return '<BatchResult %s%r: %r>' % (self.resource_cls.__name__, self.ids,
+                                            self.error if self.error is not None else self.resource)
+
+
+def _key(ids):
+    return tuple(ids) if isinstance(ids, (list, tuple)) else ids
+
+
+class BatchFetcher(object):
+    """Fetches many resources by id concurrently.
+
+    Identical references are fetched once, on a pool of up to ``workers``
+    threads that lives for the duration of the batch; the client's worker
+    pool is never used, so batches can be fetched from its workers. A failed
+    fetch is reported on its BatchResult and does not stop the others.
+    """
+
+    def __init__(self, client, workers=8):
+        self.client = client
+        self.workers = workers
+
+    def _fetch(self, key):
+        resource_cls, ids = key
+        try:
+            resource = find_resource(resource_cls, self.client._options, self.client._session, ids)
+            return key, resource, None
+        except Exception as e:
+            return key, None, e
+
+    def iter_results(self, refs):
+        """Yield a BatchResult per reference as soon as its fetch finishes."""
+        positions = {}
+        for index, (resource_cls, ids) in enumerate(refs):
+            positions.setdefault((resource_cls, _key(ids)), []).append((index, ids))
+        if not positions:
+            return
+
+        pool = ThreadPool(min(self.workers, len(positions)))
+        try:
+            for key, resource, error in pool.imap_unordered(self._fetch, list(positions)):
+                for index, ids in positions[key]:
+                    yield BatchResult(index, key[0], ids, resource, error)
+        finally:
+            pool.terminate()
+
+    def fetch(self, refs):
+        """Return the BatchResults of all references in input order."""
+        refs = list(refs)
+        results = [None] * len(refs)
+        for result in self.iter_results(refs):
+            results[result.index] = result
+        return results
@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheEntry(object):
+    __slots__ = ('stored_at', 'status_code', 'headers', 'content', 'url', 'encoding')
+
+    def __init__(self, stored_at, status_code, headers, content, url, encoding):
+        self.stored_at = stored_at
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+        self.encoding = encoding
+
+    @classmethod
+    def from_response(cls, r):
+        return cls(time.time(), r.status_code, dict(r.headers), r.content, r.url, r.encoding)
+
+    def to_response(self):
+        from requests import Response
+        from requests.structures import CaseInsensitiveDict
+        r = Response()
+        r.status_code = self.status_code
+        r.headers = CaseInsensitiveDict(self.headers)
+        r._content = self.content
+        r.url = self.url
+        r.encoding = self.encoding
+        return r
+
+    def validators(self):
+        headers = {}
+        etag = self.headers.get('ETag') or self.headers.get('etag')
+        last_modified = self.headers.get('Last-Modified') or self.headers.get('last-modified')
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+
+class MemoryCache(object):
+    """In-process LRU cache backend."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteCache(object):
+    """On-disk LRU cache backend, shareable between processes."""
+
+    def __init__(self, path, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        import sqlite3
+        self._binary = sqlite3.Binary
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY, accessed_at REAL, stored_at REAL, status_code INTEGER,'
+            ' headers TEXT, content BLOB, url TEXT, encoding TEXT)')
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT stored_at, status_code, headers, content, url, encoding'
+                ' FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE responses SET accessed_at = ? WHERE key = ?',
+                             (time.time(), key))
+            self._db.commit()
+        stored_at, status_code, headers, content, url, encoding = row
+        return CacheEntry(stored_at, status_code, json.loads(headers), bytes(content), url, encoding)
+
+    def set(self, key, entry):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, time.time(), entry.stored_at, entry.status_code, json.dumps(entry.headers),
+                 self._binary(entry.content), entry.url, entry.encoding))
+            self._db.execute(
+                'DELETE FROM responses WHERE key IN (SELECT key FROM responses'
+                ' ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+            self._db.commit()
+
+
+class ResponseCache(object):
+    """Caching policy for ResilientSession.get.
+
+    Successful responses are stored under their URL, query parameters and
+    user. Within ``ttl`` seconds they are served without a request; after
+    that they are revalidated with ``If-None-Match``/``If-Modified-Since``
+    when the server sent an ``ETag`` or ``Last-Modified``, and refetched
+    otherwise.
+    """
+
+    def __init__(self, backend=None, ttl=60):
+        if backend is None:
+            backend = MemoryCache()
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    @staticmethod
+    def key(url, params=None, user=None):
+        params = sorted((params or {}).items())
+        return json.dumps([user, url, params])
+
+    def get(self, key, fetch, headers=None):
+        """Return a response for ``key``, calling ``fetch(headers)`` when needed."""
+        entry = self.backend.get(key)
+        if entry is not None and time.time() - entry.stored_at < self.ttl:
+            self.hits += 1
+            return entry.to_response()
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(entry.validators())
+        r = fetch(request_headers)
+
+        if r.status_code == 304 and entry is not None:
+            self.revalidated += 1
+            entry.stored_at = time.time()
+            self.backend.set(key, entry)
+            return entry.to_response()
+
+        self.misses += 1
+        if r.status_code == 200:
+            self.backend.set(key, CacheEntry.from_response(r))
+        else:
+            self.backend.delete(key)
+        return r
+
+    def invalidate(self, url, params=None, user=None):
+        self.backend.delete(self.key(url, params, user))
+
+    def clear(self):
+        self.backend.clear()
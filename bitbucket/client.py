@@ -1,11 +1,11 @@
-import copy
 import sys
+from itertools import imap
 from urlparse import urlparse
 
-from bitbucket.exceptions import BitbucketError
-from bitbucket.resilientsession import ResilientSession
-from bitbucket.resources import Resource, Project
-from bitbucket.utils import json_loads
+# requests, multiprocessing and the optional features are imported where they
+# are first needed, which keeps ``import bitbucket`` cheap for short-lived
+# processes such as git hooks.
+from bitbucket.resources import IdentityMap, Resource, Project, find_resource, iter_resources
 
 
 class Bitbucket(object):
@@ -22,6 +22,16 @@ class Bitbucket(object):
         "client_cert": None,
         "check_update": False,
         "delay_reload": 0,
+        "page_size": 100,
+        "prefetch_pages": 2,
+        "lazy_resources": False,
+        "identity_map_size": None,
+        "pool_connections": 10,
+        "pool_maxsize": 10,
+        "pool_block": False,
+        "tcp_keepalive": None,
+        "stream_listings": False,
+        "coalesce_requests": False,
         "headers": {
             'Cache-Control': 'no-cache',
             'Content-Type': 'application/json',  # ;charset=UTF-8',
@@ -40,24 +50,28 @@ class Bitbucket(object):
                  max_retries=3,
                  proxies=None,
                  timeout=None,
+                 cache=None,
+                 retry_policy=None,
+                 rate_limiter=None,
+                 adapters=None,
+                 instrumentation=None,
+                 store=None,
+                 recorder=None,
+                 replayer=None,
                  ):
-        self.sys_version_info = tuple([i for i in sys.version_info])
-
-        if options is None:
-            options = {}
+        self.sys_version_info = tuple(sys.version_info)
 
+        self._options = dict(Bitbucket.DEFAULT_OPTIONS)
+        if options:
+            self._options.update(options)
         if server:
-            options['server'] = server
+            self._options['server'] = server
         if async_:
-            options['async'] = async_
-            options['async_workers'] = async_workers
+            self._options['async'] = async_
+            self._options['async_workers'] = async_workers
 
         self.logging = logging
 
-        self._options = copy.copy(Bitbucket.DEFAULT_OPTIONS)
-
-        self._options.update(options)
-
         self._rank = None
 
         if self._options['server'].endswith('/'):
@@ -68,18 +82,85 @@ class Bitbucket(object):
             self._options['context_path'] = context_path
 
         if basic_auth:
-            self._create_http_basic_session(*basic_auth, timeout=timeout)
-            self._session.headers.update(self._options['headers'])
+            self._create_http_basic_session(*basic_auth, timeout=timeout, cache=cache,
+                                            retry_policy=retry_policy,
+                                            rate_limiter=rate_limiter,
+                                            instrumentation=instrumentation)
+            self._mount_adapters(adapters)
         self._session.headers.update(self._options['headers'])
 
-        self._session.max_retries = max_retries
+        if retry_policy is None:
+            self._session.max_retries = max_retries
 
         if proxies:
             self._session.proxies = proxies
 
-    def _create_http_basic_session(self, username, password, timeout=None):
+        self._session.store = store
+        self._session.recorder = recorder
+        self._session.replayer = replayer
+
+        if self._options['identity_map_size']:
+            self._session.identity_map = IdentityMap(self._options['identity_map_size'])
+
+        if self._options['coalesce_requests']:
+            from bitbucket.singleflight import SingleFlight
+            self._session.single_flight = SingleFlight()
+
+        if self._options['async']:
+            from multiprocessing.pool import ThreadPool
+            self._session.pool = ThreadPool(self._options['async_workers'])
+            # Page fetches only; a listing waiting on them never occupies this pool.
+            self._session.prefetch_pool = ThreadPool(self._options['async_workers'])
+
+    def _mount_adapters(self, adapters=None):
+        if adapters is None:
+            from bitbucket.adapters import PooledHTTPAdapter
+            maxsize = self._options['pool_maxsize']
+            if self._options['async']:
+                maxsize = max(maxsize, self._options['async_workers'])
+            adapter = PooledHTTPAdapter(pool_connections=self._options['pool_connections'],
+                                        pool_maxsize=maxsize,
+                                        pool_block=self._options['pool_block'],
+                                        tcp_keepalive=self._options['tcp_keepalive'])
+            adapters = {'http://': adapter, 'https://': adapter}
+        for prefix, adapter in adapters.items():
+            self._session.mount(prefix, adapter)
+
+    def pool_stats(self):
+        """Connection pool counters summed over the session's pooled adapters."""
+        totals = {}
+        adapters = set(self._session.adapters.values())
+        for adapter in adapters:
+            if hasattr(adapter, 'stats'):
+                for key, value in adapter.stats().items():
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def close(self):
+        for name in ('pool', 'prefetch_pool'):
+            pool = getattr(self._session, name)
+            if pool is not None:
+                pool.terminate()
+                setattr(self._session, name, None)
+        if self._session.recorder is not None:
+            self._session.recorder.close()
+
+    def map(self, func, iterable):
+        """Apply ``func`` to every item, on the worker pool in async mode.
+
+        Results are yielded in input order.
+        """
+        if self._session.pool is None:
+            return imap(func, iterable)
+        return self._session.pool.imap(func, iterable)
+
+    def _create_http_basic_session(self, username, password, timeout=None, cache=None,
+                                   retry_policy=None, rate_limiter=None, instrumentation=None):
+        from bitbucket.resilientsession import ResilientSession
         verify = self._options['verify']
-        self._session = ResilientSession(timeout=timeout)
+        self._session = ResilientSession(timeout=timeout, cache=cache, retry_policy=retry_policy,
+                                         rate_limiter=rate_limiter,
+                                         instrumentation=instrumentation)
         self._session.verify = verify
         self._session.auth = (username, password)
         self._session.cert = self._options['client_cert']
@@ -90,22 +171,65 @@ class Bitbucket(object):
         return resource
 
     def _find_for_resource(self, resource_cls, ids, expand=None):
-        resource = resource_cls(self._options, self._session)
-        params = {}
-        if expand is not None:
-            params['expand'] = expand
-        resource.find(id=ids, params=params)
-        if not resource:
-            raise BitbucketError("Unable to find resource %s(%s)", resource_cls, ids)
-        return resource
+        return find_resource(resource_cls, self._options, self._session, ids, expand)
 
     def project(self, id):
         return self._find_for_resource(Project, id)
 
-    def projects(self):
-        url = self._options['server'] + '/rest/api/1.0/projects'
-        r_json = json_loads(self._session.get(url))
-        projects = [Project(self._options, self._session, raw_project_json)
-                    for raw_project_json in r_json['values']]
+    def get_many(self, refs, workers=8):
+        """Fetch ``(resource_cls, ids)`` references concurrently, e.g.
+        ``[(PullRequest, ('PRJ', 'repo', 12)), (Repo, ('PRJ', 'repo'))]``.
+
+        Returns a BatchResult per reference, in order; failed fetches carry
+        their exception in ``error``. See BatchFetcher.
+        """
+        from bitbucket.batch import BatchFetcher
+        return BatchFetcher(self, workers).fetch(refs)
 
-        return projects
+    def iter_many(self, refs, workers=8):
+        """Like get_many, but yields each BatchResult as soon as it is fetched."""
+        from bitbucket.batch import BatchFetcher
+        return BatchFetcher(self, workers).iter_results(refs)
+
+    def iter_projects(self, page_size=None, prefetch=None, **params):
+        url = self._options['server'] + '/rest/api/1.0/projects'
+        return iter_resources(Project, self._options, self._session, url, params,
+                              page_size, prefetch)
+
+    def projects(self, **params):
+        if not params:
+            params = {'limit': 1000}
+        return list(self.iter_projects(**params))
+
+    def iter_all_repos(self, projects=None):
+        """Yield the repos of every project, fetching projects concurrently in async mode."""
+        if projects is None:
+            projects = self.iter_projects()
+        for repos in self.map(lambda project: list(project.iter_repos()), projects):
+            for repo in repos:
+                yield repo
+
+    def crawl_inventory(self, workers=8, checkpoint=None, progress=None, callback=None,
+                        pull_request_state='OPEN'):
+        """Crawl every repo of every project with its open pull requests and
+        latest merge commit, see InventoryCrawler.
+
+        Returns a generator of RepoInventory items, or, when ``callback`` is
+        given, calls it for each item and returns the crawl counters.
+        """
+        from bitbucket.crawler import InventoryCrawler
+        crawler = InventoryCrawler(self, workers, checkpoint, progress, pull_request_state)
+        if callback is None:
+            return crawler.crawl()
+        for inventory in crawler.crawl():
+            callback(inventory)
+        return crawler.stats
+
+    def sync_pull_requests(self, store, repos=None, full=False):
+        """Bring ``store`` up to date with the pull requests changed since the
+        last sync, see PullRequestSync. Defaults to every repo of every project.
+        """
+        from bitbucket.sync import PullRequestSync
+        if repos is None:
+            repos = self.iter_all_repos()
+        return PullRequestSync(store, self._options['page_size']).sync(repos, full)
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import time
+from multiprocessing.pool import ThreadPool
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from bitbucket.resources import Commit
+
+
+class RepoInventory(object):
+    """One crawled repo: its open pull requests and latest merge commit.
+
+    ``error`` holds the exception if the repo (or its project) could not be
+    crawled; such repos are not checkpointed and are retried on resume.
+    """
+    __slots__ = ('project', 'repo', 'pull_requests', 'latest_merge_commit', 'error')
+
+    def __init__(self, project, repo, pull_requests=None, latest_merge_commit=None, error=None):
+        self.project = project
+        self.repo = repo
+        self.pull_requests = pull_requests if pull_requests is not None else []
+        self.latest_merge_commit = latest_merge_commit
+        self.error = error
+
+
+def _key(resource, name):
+    return getattr(resource, name, None) or resource.name
+
+
+class InventoryCrawler(object):
+    """Walks projects -> repos -> open pull requests + latest merge commit.
+
+    Listing repos of a project and crawling a repo are independent tasks on a
+    pool of ``workers`` threads; results are yielded as soon as each repo is
+    done. With ``checkpoint`` (a file path) finished repos and projects are
+    appended to a JSON-lines file and skipped when a crawl is restarted.
+    ``progress`` is called with a dict of counters after every repo.
+    """
+
+    def __init__(self, client, workers=8, checkpoint=None, progress=None,
+                 pull_request_state='OPEN'):
+        self.client = client
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.pull_request_state = pull_request_state
+        self.stats = {}
+
+    def _load_checkpoint(self):
+        projects, repos = set(), set()
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    if 'project' in entry:
+                        projects.add(entry['project'])
+                    elif 'repo' in entry:
+                        repos.add(entry['repo'])
+        return projects, repos
+
+    # Worker tasks.
+
+    def _list_projects(self):
+        return 'projects', None, list(self.client.iter_projects())
+
+    def _list_repos(self, project):
+        return 'repos', project, list(project.iter_repos())
+
+    def _crawl_repo(self, project, repo):
+        pull_requests = list(repo.iter_pull_requests(state=self.pull_request_state))
+        commit = repo.latest_merge_commit()
+        if not isinstance(commit, Commit):
+            commit = None
+        return 'repo', (project, repo), RepoInventory(project, repo, pull_requests, commit)
+
+    @staticmethod
+    def _guard(task, *args):
+        try:
+            return task(*args)
+        except Exception as e:
+            return 'error', (task.__name__,) + args, e
+
+    def crawl(self):
+        """Yield a RepoInventory for every repo as soon as it is crawled."""
+        done_projects, done_repos = self._load_checkpoint()
+        stats = self.stats = {'projects': 0, 'projects_done': 0, 'repos': 0, 'repos_done': 0,
+                              'skipped': 0, 'errors': 0, 'elapsed': 0.0}
+        started = time.time()
+        remaining = {}
+        results = Queue()
+        pool = ThreadPool(self.workers)
+        checkpoint = open(self.checkpoint, 'a') if self.checkpoint else None
+        pending = [0]
+
+        def submit(task, *args):
+            pending[0] += 1
+            pool.apply_async(self._guard, (task,) + args, callback=results.put)
+
+        def record(entry):
+            if checkpoint is not None:
+                checkpoint.write(json.dumps(entry) + '\n')
+                checkpoint.flush()
+
+        def finish_project(key):
+            stats['projects_done'] += 1
+            record({'project': key})
+
+        try:
+            submit(self._list_projects)
+            while pending[0]:
+                kind, context, value = results.get()
+                pending[0] -= 1
+
+                if kind == 'projects':
+                    for project in value:
+                        stats['projects'] += 1
+                        if _key(project, 'key') in done_projects:
+                            stats['projects_done'] += 1
+                            continue
+                        submit(self._list_repos, project)
+
+                elif kind == 'repos':
+                    project_key = _key(context, 'key')
+                    remaining[project_key] = 0
+                    for repo in value:
+                        stats['repos'] += 1
+                        if '%s/%s' % (project_key, _key(repo, 'slug')) in done_repos:
+                            stats['skipped'] += 1
+                            continue
+                        remaining[project_key] += 1
+                        submit(self._crawl_repo, context, repo)
+                    if not remaining[project_key]:
+                        finish_project(project_key)
+
+                elif kind == 'repo':
+                    project, repo = context
+                    project_key = _key(project, 'key')
+                    stats['repos_done'] += 1
+                    record({'repo': '%s/%s' % (project_key, _key(repo, 'slug'))})
+                    remaining[project_key] -= 1
+                    if not remaining[project_key]:
+                        finish_project(project_key)
+                    yield value
+
+                else:
+                    stats['errors'] += 1
+                    task_name, args = context[0], context[1:]
+                    if task_name == '_list_projects':
+                        raise value
+                    logging.warning("Crawler task %s%r failed: %s", task_name, args, value)
+                    if task_name == '_crawl_repo':
+                        yield RepoInventory(args[0], args[1], error=value)
+
+                stats['elapsed'] = time.time() - started
+                if self.progress is not None:
+                    self.progress(dict(stats))
+        finally:
+            pool.terminate()
+            if checkpoint is not None:
+                checkpoint.close()
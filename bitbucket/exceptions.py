@@ -1,5 +1,125 @@
 import os
-import tempfile
+import threading
+import time
+try:
+    from Queue import Queue, Full
+except ImportError:
+    from queue import Queue, Full
+
+from bitbucket import jsoncodec
+
+
+def retry_after(response):
+    """Seconds a response's Retry-After header asks to wait, or None.
+
+    The header is either a number of seconds or an HTTP date.
+    """
+    value = getattr(response, 'headers', {}).get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        from email.utils import mktime_tz, parsedate_tz
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0.0, mktime_tz(date) - time.time())
+
+
+def error_message(response):
+    """The error message of a failed response, from its JSON body if possible.
+
+    The body is decoded at most once per response (see ``json_loads``).
+    """
+    if response.status_code == 403 and "x-authentication-denied-reason" in response.headers:
+        return response.headers["x-authentication-denied-reason"]
+    if not response.content:
+        return ''
+    body = getattr(response, 'decoded_json', None)
+    if body is None:
+        try:
+            body = response.decoded_json = jsoncodec.loads(response.content)
+        except ValueError:
+            return response.text
+    if not isinstance(body, dict):
+        return response.text
+    if 'message' in body:
+        return body['message']
+    if 'errorMessages' in body and len(body['errorMessages']) > 0:
+        error_messages = body['errorMessages']
+        if isinstance(error_messages, (list, tuple)):
+            return error_messages[0]
+        return error_messages
+    if 'errors' in body and len(body['errors']) > 0:
+        errors = body['errors']
+        if isinstance(errors, dict):
+            return ", ".join(errors.values())
+        # Bitbucket Server: {"errors": [{"message": ...}, ...]}
+        messages = [e.get('message', '') for e in errors if isinstance(e, dict)]
+        if any(messages):
+            return ", ".join(messages)
+    return response.text
+
+
+class ErrorSpool(object):
+    """Appends error details to a single file from a background thread.
+
+    At most ``max_pending`` errors wait to be written and the file stops
+    growing at ``max_bytes``; errors beyond either bound are only counted in
+    ``dropped``. Details are built on the writer thread, never by the code
+    that raised or printed the error.
+    """
+
+    def __init__(self, path=None, max_pending=100, max_bytes=10 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.dropped = 0
+        self._queue = Queue(max_pending)
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._thread = None
+
+    def submit(self, error):
+        """Queue ``error`` and return a reference to its future entry, or None."""
+        with self._lock:
+            if self.path is None:
+                import tempfile
+                fd, self.path = tempfile.mkstemp(suffix='.log', prefix='Bitbucketerror-')
+                os.close(fd)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name='BitbucketErrorSpool')
+                self._thread.daemon = True
+                self._thread.start()
+            self._sequence += 1
+            sequence = self._sequence
+        try:
+            self._queue.put_nowait((sequence, error))
+        except Full:
+            self.dropped += 1
+            return None
+        return '%s#%d' % (self.path, sequence)
+
+    def _write_loop(self):
+        while True:
+            sequence, error = self._queue.get()
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    self.dropped += 1
+                    continue
+                entry = '#%d %s%s\n' % (sequence, error.summary(), error.details())
+                with open(self.path, 'a') as f:
+                    f.write(entry.encode('utf-8') if not isinstance(entry, str) else entry)
+                self.written += 1
+            except Exception:
+                self.dropped += 1
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued error has been written."""
+        self._queue.join()
 
 
 class BitbucketError(Exception):
@@ -9,6 +129,9 @@ class BitbucketError(Exception):
     if 'TRAVIS' in os.environ:
         log_to_tempfile = False
 
+    # Receives the details of errors stringified with PYBitbucket_LOG_TO_TEMPFILE set.
+    spool = ErrorSpool()
+
     def __init__(self,
                  status_code=None,
                  text=None,
@@ -21,7 +144,8 @@ class BitbucketError(Exception):
 
         :param status_code: Status code for the error.
         :type status_code: Optional[int]
-        :param text: Message for the error.
+        :param text: Message for the error; derived from ``response`` on first
+            access when not given.
         :type text: Optional[str]
         :param url: Url related to the error.
         :type url: Optional[str]
@@ -32,27 +156,36 @@ class BitbucketError(Exception):
         :type kwargs: **Any
         """
         self.status_code = status_code
-        self.text = text
+        self._text = text
         self.url = url
         self.request = request
         self.response = response
         self.headers = kwargs.get('headers', None)
         self.log_to_tempfile = False
         self.travis = False
+        self._spooled = None
         if 'PYBitbucket_LOG_TO_TEMPFILE' in os.environ:
             self.log_to_tempfile = True
         if 'TRAVIS' in os.environ:
             self.travis = True
 
-    def __str__(self):
-        """Return a string representation of the error.
+    @property
+    def text(self):
+        if self._text is None and self.response is not None and (self.status_code or 0) >= 400:
+            self._text = error_message(self.response)
+        return self._text
 
-        :rtype: str
-        """
+    @text.setter
+    def text(self, value):
+        self._text = value
+
+    def summary(self):
         t = "BitbucketError HTTP %s" % self.status_code
         if self.url:
             t += " url: %s" % self.url
+        return t
 
+    def details(self):
         details = ""
         if self.request is not None and hasattr(self.request, 'headers'):
             details += "\n\trequest headers = %s" % self.request.headers
@@ -65,20 +198,57 @@ class BitbucketError(Exception):
 
         if self.response is not None and hasattr(self.response, 'text'):
             details += "\n\tresponse text = %s" % self.response.text
+        return details
+
+    def __str__(self):
+        """Return a string representation of the error.
+
+        :rtype: str
+        """
+        t = self.summary()
 
         if self.travis:
             if self.text:
                 t += "\n\ttext: %s" % self.text
-            t += details
+            t += self.details()
         elif self.log_to_tempfile:
-            fd, file_name = tempfile.mkstemp(suffix='.tmp', prefix='Bitbucketerror-')
-            with open(file_name, "w") as f:
-                t += " details: %s" % file_name
-                f.write(details)
+            if self._spooled is None:
+                self._spooled = self.spool.submit(self) or 'dropped'
+            t += " details: %s" % self._spooled
         # Otherwise, just return the error as usual
         else:
             if self.text:
                 t += "\n\ttext: %s" % self.text
-            t += "\n\t" + details
+            t += "\n\t" + self.details()
 
         return t
+
+
+class BitbucketAuthError(BitbucketError):
+    """Authentication failed or the user lacks permission (HTTP 401/403)."""
+
+
+class BitbucketConflictError(BitbucketError):
+    """The resource changed or is in a conflicting state (HTTP 409), e.g. a
+    stale pull request version or a merge that is not possible."""
+
+
+class BitbucketThrottledError(BitbucketError):
+    """The server is rate limiting the client (HTTP 429)."""
+
+    @property
+    def retry_after(self):
+        """Seconds the server asked to wait, or None."""
+        return retry_after(self.response)
+
+
+STATUS_ERRORS = {
+    401: BitbucketAuthError,
+    403: BitbucketAuthError,
+    409: BitbucketConflictError,
+    429: BitbucketThrottledError,
+}
+
+
+def error_class_for(status_code):
+    return STATUS_ERRORS.get(status_code, BitbucketError)
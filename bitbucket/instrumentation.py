@@ -0,0 +1,195 @@
+import threading
+
+# Path segments following these are identifiers and are replaced by placeholders.
+_PLACEHOLDERS = {
+    'projects': '{project}',
+    'repos': '{repo}',
+    'pull-requests': '{pullRequest}',
+    'commits': '{commit}',
+    'users': '{user}',
+}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def endpoint_template(url):
+    """Reduce a request url to its REST endpoint, e.g.
+    ``/rest/api/1.0/projects/{project}/repos/{repo}/pull-requests``.
+    """
+    path = url.split('?', 1)[0]
+    scheme = path.find('://')
+    if scheme != -1:
+        slash = path.find('/', scheme + 3)
+        path = path[slash:] if slash != -1 else '/'
+    segments = path.split('/')
+    for i in range(1, len(segments)):
+        placeholder = _PLACEHOLDERS.get(segments[i - 1])
+        if placeholder is not None and segments[i]:
+            segments[i] = placeholder
+    return '/'.join(segments)
+
+
+class Instrumentation(object):
+    """Receives request events from a ResilientSession.
+
+    Override the methods, or append callables to ``before_hooks``
+    (``hook(verb, url, kwargs)``) and ``after_hooks``
+    (``hook(verb, url, response, elapsed, exception)``). Sessions without
+    instrumentation skip all of this.
+    """
+
+    def __init__(self):
+        self.before_hooks = []
+        self.after_hooks = []
+
+    def before_request(self, verb, url, kwargs):
+        for hook in self.before_hooks:
+            hook(verb, url, kwargs)
+
+    def after_request(self, verb, url, response, elapsed, exception=None):
+        for hook in self.after_hooks:
+            hook(verb, url, response, elapsed, exception)
+
+    def retry(self, verb, url, attempt, delay):
+        pass
+
+    def decoded(self, url, elapsed, size):
+        pass
+
+    def coalesced(self, verb, url):
+        pass
+
+
+class Histogram(object):
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in sorted(labels.items()))
+
+
+class MetricsCollector(Instrumentation):
+    """In-memory request metrics, grouped by verb and endpoint template."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        super(MetricsCollector, self).__init__()
+        self.buckets = buckets
+        self.latency = {}
+        self.responses = {}
+        self.retries = {}
+        self.bytes_sent = {}
+        self.bytes_received = {}
+        self.decode = {}
+        self.coalesced_requests = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(self.buckets)
+        return histogram
+
+    def after_request(self, verb, url, response, elapsed, exception=None):
+        super(MetricsCollector, self).after_request(verb, url, response, elapsed, exception)
+        key = (verb, endpoint_template(url))
+        status = response.status_code if response is not None else type(exception).__name__
+        sent = received = 0
+        if response is not None:
+            body = getattr(response.request, 'body', None)
+            sent = len(body) if body else 0
+            if getattr(response, '_content_consumed', False):
+                received = len(response.content or b'')
+            else:
+                # Streamed: counted as the caller reads it, never buffered here.
+                self._count_stream(key, response)
+        with self._lock:
+            self._histogram(self.latency, key).observe(elapsed)
+            status_key = key + (status,)
+            self.responses[status_key] = self.responses.get(status_key, 0) + 1
+            self.bytes_sent[key] = self.bytes_sent.get(key, 0) + sent
+            self.bytes_received[key] = self.bytes_received.get(key, 0) + received
+
+    def _count_stream(self, key, response):
+        iter_content = response.iter_content
+
+        def counting_iter_content(chunk_size=1, decode_unicode=False):
+            for chunk in iter_content(chunk_size, decode_unicode):
+                with self._lock:
+                    self.bytes_received[key] = self.bytes_received.get(key, 0) + len(chunk)
+                yield chunk
+        response.iter_content = counting_iter_content
+
+    def retry(self, verb, url, attempt, delay):
+        key = (verb, endpoint_template(url))
+        with self._lock:
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+    def decoded(self, url, elapsed, size):
+        with self._lock:
+            self._histogram(self.decode, endpoint_template(url)).observe(elapsed)
+
+    def coalesced(self, verb, url):
+        key = (verb, endpoint_template(url))
+        with self._lock:
+            self.coalesced_requests[key] = self.coalesced_requests.get(key, 0) + 1
+
+    def to_prometheus(self, prefix='bitbucket'):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def histogram(name, help, table, labels):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help))
+            lines.append('# TYPE %s_%s histogram' % (prefix, name))
+            for key, h in sorted(table.items()):
+                label_values = labels(key)
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append('%s_%s_bucket%s %d' % (
+                        prefix, name, _labels(le=repr(float(bound)), **label_values), cumulative))
+                lines.append('%s_%s_bucket%s %d' % (
+                    prefix, name, _labels(le='+Inf', **label_values), h.count))
+                lines.append('%s_%s_sum%s %r' % (prefix, name, _labels(**label_values), h.sum))
+                lines.append('%s_%s_count%s %d' % (prefix, name, _labels(**label_values), h.count))
+
+        def counter(name, help, table, labels):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help))
+            lines.append('# TYPE %s_%s counter' % (prefix, name))
+            for key, value in sorted(table.items()):
+                lines.append('%s_%s%s %d' % (prefix, name, _labels(**labels(key)), value))
+
+        def by_endpoint(key):
+            return {'method': key[0], 'endpoint': key[1]}
+
+        with self._lock:
+            histogram('request_duration_seconds', 'HTTP request latency per attempt.',
+                      self.latency, by_endpoint)
+            counter('responses_total', 'Responses by status code.', self.responses,
+                    lambda key: {'method': key[0], 'endpoint': key[1], 'status': key[2]})
+            counter('request_retries_total', 'Retried requests.', self.retries, by_endpoint)
+            counter('requests_coalesced_total',
+                    'Requests served by an identical request already in flight.',
+                    self.coalesced_requests, by_endpoint)
+            counter('request_bytes_total', 'Request body bytes sent.', self.bytes_sent,
+                    by_endpoint)
+            counter('response_bytes_total', 'Response body bytes received.',
+                    self.bytes_received, by_endpoint)
+            histogram('json_decode_seconds', 'Time spent decoding JSON responses.',
+                      self.decode, lambda key: {'endpoint': key})
+        return '\n'.join(lines) + '\n'
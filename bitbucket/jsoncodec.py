@@ -0,0 +1,69 @@
+"""JSON encoding and decoding through the fastest installed backend.
+
+orjson is preferred, then ujson, then the standard library. Select one
+explicitly with ``set_backend`` (e.g. to compare them).
+"""
+import json
+
+
+class JSONBackend(object):
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+
+def _orjson():
+    import orjson
+    return JSONBackend('orjson', orjson.loads, lambda obj: orjson.dumps(obj).decode('utf-8'))
+
+
+def _ujson():
+    import ujson
+    return JSONBackend('ujson', ujson.loads, ujson.dumps)
+
+
+def _stdlib():
+    return JSONBackend('json', json.loads, json.dumps)
+
+
+_factories = (('orjson', _orjson), ('ujson', _ujson), ('json', _stdlib))
+
+
+def available_backends():
+    backends = []
+    for name, factory in _factories:
+        try:
+            backends.append(factory())
+        except ImportError:
+            pass
+    return backends
+
+
+def get_backend(name=None):
+    # Only the selected backend is imported.
+    for backend_name, factory in _factories:
+        if name is None or backend_name == name:
+            try:
+                return factory()
+            except ImportError:
+                if name is not None:
+                    break
+    raise ValueError('JSON backend %r is not installed' % name)
+
+
+backend = get_backend()
+
+
+def set_backend(name=None):
+    global backend
+    backend = get_backend(name)
+    return backend
+
+
+def loads(s):
+    return backend.loads(s)
+
+
+def dumps(obj):
+    return backend.dumps(obj)
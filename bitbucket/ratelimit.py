@@ -0,0 +1,110 @@
+import threading
+import time
+
+
+class RateLimiter(object):
+    """Token bucket with an optional cap on requests in flight.
+
+    One limiter can be handed to any number of clients and threads, which
+    then share its budget. With ``adaptive`` set, rate and concurrency follow
+    AIMD: each success raises them a little (by about ``increase`` requests
+    per second, per second), while a throttle response (429/503) or a
+    latency above ``latency_target`` multiplies them by ``decrease``, at most
+    once per ``cooldown`` seconds.
+    """
+
+    THROTTLE_STATUSES = frozenset([429, 503])
+
+    def __init__(self,
+                 rate=10.0,
+                 burst=None,
+                 max_concurrency=None,
+                 adaptive=False,
+                 min_rate=0.5,
+                 max_rate=None,
+                 increase=1.0,
+                 decrease=0.5,
+                 latency_target=None,
+                 cooldown=1.0,
+                 ):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.concurrency = float(max_concurrency) if max_concurrency else None
+        self.max_concurrency = self.concurrency
+        self.adaptive = adaptive
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else self.rate * 10
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.throttled = 0
+        self.waited = 0.0
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        started = time.time()
+        with self._cond:
+            while True:
+                now = time.time()
+                self._refill(now)
+                if self.concurrency is not None and self._in_flight >= int(self.concurrency):
+                    self._cond.wait(0.1)
+                    continue
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    break
+                self._cond.wait((1 - self._tokens) / self.rate)
+            self.waited += time.time() - started
+
+    def release(self, status_code=None, latency=None):
+        with self._cond:
+            self._in_flight -= 1
+            if status_code in self.THROTTLE_STATUSES:
+                self.throttled += 1
+            if self.adaptive:
+                congested = (status_code in self.THROTTLE_STATUSES or
+                             (self.latency_target is not None and latency is not None and
+                              latency > self.latency_target))
+                if congested:
+                    self._decrease()
+                elif status_code is not None and status_code < 500:
+                    self._increase()
+            self._cond.notify_all()
+
+    def _increase(self):
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+        self.burst = max(1.0, self.rate)
+        if self.concurrency is not None:
+            self.concurrency = min(self.max_concurrency,
+                                   self.concurrency + 1.0 / self.concurrency)
+
+    def _decrease(self):
+        now = time.time()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.burst = max(1.0, self.rate)
+        self._tokens = min(self._tokens, self.burst)
+        if self.concurrency is not None:
+            self.concurrency = max(1.0, self.concurrency * self.decrease)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'rate': self.rate,
+                'concurrency': self.concurrency,
+                'in_flight': self._in_flight,
+                'throttled': self.throttled,
+                'waited': self.waited,
+            }
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+MAGIC = b'BBREC1\n'
+INDEX_MAGIC = b'BBIDX1\n'
+# Per exchange: request digest, metadata length, compressed body length.
+RECORD = struct.Struct('!16sII')
+# Per index entry: request digest, sequence number, record offset.
+INDEX_ENTRY = struct.Struct('!16sIQ')
+
+
+def request_key(verb, url, params=None, data=None):
+    """Digest identifying a request by method, url path, query parameters and
+    body; the server part of the url is left out so archives can be replayed
+    against any base url.
+    """
+    scheme = url.find('://')
+    if scheme != -1:
+        slash = url.find('/', scheme + 3)
+        url = url[slash:] if slash != -1 else '/'
+    if isinstance(params, dict):
+        params = sorted(('%s' % k, '%s' % v) for k, v in params.items())
+    elif params is not None:
+        params = [('%s' % k, '%s' % v) for k, v in params]
+    if isinstance(data, bytes) and not isinstance(data, str):
+        data = data.decode('latin-1')
+    key = json.dumps([verb.upper(), url, params, data])
+    return hashlib.md5(key.encode('utf-8')).digest()
+
+
+class ReplayMiss(KeyError):
+    """The replayed archive holds no response for a request."""
+
+
+class TrafficRecorder(object):
+    """Appends every request/response exchange of a session to an archive.
+
+    The archive at ``path`` holds one record per exchange: status, headers,
+    recorded latency and the zlib-compressed body. ``close`` writes the
+    sorted ``path + '.idx'`` index used by TrafficReplayer; archives without
+    one are indexed when opened.
+    """
+
+    def __init__(self, path, compression=6):
+        self.path = path
+        self.compression = compression
+        self._entries = []
+        self._lock = threading.Lock()
+        if os.path.exists(path + '.idx'):
+            os.remove(path + '.idx')  # belongs to a previous recording
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+
+    def record(self, verb, url, kwargs, response, elapsed):
+        if kwargs.get('stream'):
+            return self._record_stream(verb, url, kwargs, response, elapsed)
+        body = zlib.compress(response.content or b'', self.compression)
+        self._write(verb, url, kwargs, response, elapsed, body)
+
+    def _record_stream(self, verb, url, kwargs, response, elapsed):
+        """Compress a streamed body as the caller reads it, so it is never held
+        uncompressed; the exchange is written once the body is fully read.
+        """
+        iter_content = response.iter_content
+
+        def recording_iter_content(chunk_size=1, decode_unicode=False):
+            compressor = zlib.compressobj(self.compression)
+            parts = []
+            for chunk in iter_content(chunk_size, decode_unicode):
+                parts.append(compressor.compress(chunk))
+                yield chunk
+            parts.append(compressor.flush())
+            self._write(verb, url, kwargs, response, elapsed, b''.join(parts))
+        response.iter_content = recording_iter_content
+
+    def _write(self, verb, url, kwargs, response, elapsed, body):
+        meta = json.dumps({
+            'method': verb, 'url': url, 'params': _plain_params(kwargs.get('params')),
+            'status': response.status_code, 'headers': dict(response.headers),
+            'response_url': response.url, 'encoding': response.encoding, 'elapsed': elapsed,
+        }).encode('utf-8')
+        digest = request_key(verb, url, kwargs.get('params'), kwargs.get('data'))
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(RECORD.pack(digest, len(meta), len(body)))
+            self._file.write(meta)
+            self._file.write(body)
+            self._entries.append((digest, len(self._entries), offset))
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+            _write_index(self.path + '.idx', self._entries)
+
+
+def _plain_params(params):
+    if isinstance(params, dict):
+        return sorted(('%s' % k, '%s' % v) for k, v in params.items())
+    return params
+
+
+def _write_index(path, entries):
+    with open(path, 'wb') as f:
+        f.write(INDEX_MAGIC)
+        for entry in sorted(entries):
+            f.write(INDEX_ENTRY.pack(*entry))
+
+
+class TrafficReplayer(object):
+    """Serves a session's requests from a TrafficRecorder archive.
+
+    The archive and its index are memory-mapped; a lookup is a binary search
+    over the index. A request recorded several times gets the recorded
+    responses in order, then the last one again. With ``latency_scale`` 1.0
+    each response is delayed by its recorded latency (0.0, the default,
+    replays at full speed).
+    """
+
+    def __init__(self, path, latency_scale=0.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.hits = 0
+        self.misses = 0
+        self._cursors = {}
+        self._lock = threading.Lock()
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not a traffic archive' % path)
+        if not os.path.exists(path + '.idx'):
+            _write_index(path + '.idx', self._scan())
+        with open(path + '.idx', 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._count = (len(self._index) - len(INDEX_MAGIC)) // INDEX_ENTRY.size
+
+    def _scan(self):
+        """Index entries of an archive whose recorder was not closed."""
+        entries = []
+        offset = len(MAGIC)
+        while offset + RECORD.size <= len(self._data):
+            digest, meta_size, body_size = RECORD.unpack_from(self._data, offset)
+            end = offset + RECORD.size + meta_size + body_size
+            if end > len(self._data):
+                break  # cut short while recording
+            entries.append((digest, len(entries), offset))
+            offset = end
+        return entries
+
+    def _entry(self, i):
+        return INDEX_ENTRY.unpack_from(self._index, len(INDEX_MAGIC) + i * INDEX_ENTRY.size)
+
+    def _find(self, digest):
+        """Offsets of the records for ``digest``, in recording order."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[0] < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        offsets = []
+        while lo < self._count:
+            entry = self._entry(lo)
+            if entry[0] != digest:
+                break
+            offsets.append(entry[2])
+            lo += 1
+        return offsets
+
+    def _load(self, offset):
+        digest, meta_size, body_size = RECORD.unpack_from(self._data, offset)
+        start = offset + RECORD.size
+        meta = json.loads(self._data[start:start + meta_size].decode('utf-8'))
+        body = zlib.decompress(self._data[start + meta_size:start + meta_size + body_size])
+        return meta, body
+
+    def replay(self, verb, url, kwargs):
+        digest = request_key(verb, url, kwargs.get('params'), kwargs.get('data'))
+        offsets = self._find(digest)
+        with self._lock:
+            if not offsets:
+                self.misses += 1
+                raise ReplayMiss('%s %s %r not recorded' % (verb, url, kwargs.get('params')))
+            self.hits += 1
+            served = self._cursors.get(digest, 0)
+            self._cursors[digest] = served + 1
+        meta, body = self._load(offsets[min(served, len(offsets) - 1)])
+        if self.latency_scale:
+            time.sleep(meta['elapsed'] * self.latency_scale)
+
+        r = Response()
+        r.status_code = meta['status']
+        r.headers = CaseInsensitiveDict(meta['headers'])
+        r._content = body
+        r._content_consumed = True
+        r.url = meta['response_url']
+        r.encoding = meta['encoding']
+        return r
+
+    def close(self):
+        self._index.close()
+        self._data.close()
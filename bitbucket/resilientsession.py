@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
-import json
 import logging
 try:  # Python 2.7+
     from logging import NullHandler
@@ -9,83 +8,74 @@ except ImportError:
 
         def emit(self, record):
             pass
-import random
 from requests.exceptions import ConnectionError
 from requests import Session
 import time
 
-from bitbucket.exceptions import BitbucketError
+from bitbucket import jsoncodec
+from bitbucket.retry import RetryPolicy
+from bitbucket.utils import raise_on_error
 
 logging.getLogger('bitbucket').addHandler(NullHandler())
 
 
-def raise_on_error(r, verb='???', **kwargs):
-    request = kwargs.get('request', None)
-
-    if r is None:
-        raise BitbucketError(None, **kwargs)
-
-    if r.status_code >= 400:
-        error = ''
-        if r.status_code == 403 and "x-authentication-denied-reason" in r.headers:
-            error = r.headers["x-authentication-denied-reason"]
-        elif r.text:
-            try:
-                response = json.loads(r.text)
-                if 'message' in response:
-                    error = response['message']
-                elif 'errorMessages' in response and len(response['errorMessages']) > 0:
-                    errorMessages = response['errorMessages']
-                    if isinstance(errorMessages, (list, tuple)):
-                        error = errorMessages[0]
-                    else:
-                        error = errorMessages
-                elif 'errors' in response and len(response['errors']) > 0 and isinstance(response['errors'], dict):
-                    error_list = response['errors'].values()
-                    error = ", ".join(error_list)
-                else:
-                    error = r.text
-            except ValueError:
-                error = r.text
-        raise BitbucketError(
-            r.status_code, error, r.url, request=request, response=r, **kwargs)
-    if r.status_code not in [200, 201, 202, 204]:
-        raise BitbucketError(r.status_code, request=request, response=r, **kwargs)
-    if r.status_code == 200 and len(r.content) == 0 \
-            and 'X-Seraph-LoginReason' in r.headers \
-            and 'AUTHENTICATED_FAILED' in r.headers['X-Seraph-LoginReason']:
-        pass
-
-
 class ResilientSession(Session):
-    def __init__(self, timeout=None):
-        self.max_retries = 3
+    def __init__(self, timeout=None, cache=None, retry_policy=None, rate_limiter=None,
+                 instrumentation=None, single_flight=None, recorder=None, replayer=None):
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.instrumentation = instrumentation
         self.timeout = timeout
+        self.cache = cache
+        self.single_flight = single_flight
+        self.recorder = recorder
+        self.replayer = replayer
+        self.pool = None
+        self.prefetch_pool = None
+        # Semaphore capping the requests sent at once from any thread.
+        self.in_flight_limit = None
+        self.merge_commit_indexes = {}
+        self.identity_map = None
+        self.store = None
+        self.sleep = time.sleep
         super(ResilientSession, self).__init__()
 
         self.headers.update({"Accept": "application/json,*.*;q=0.9"})
 
-    def __recoverable(self, response, url, request, counter=1):
+    @property
+    def max_retries(self):
+        return self.retry_policy.max_retries
+
+    @max_retries.setter
+    def max_retries(self, value):
+        self.retry_policy.max_retries = value
+
+    def __recoverable(self, response, url, request, counter=1, previous_delay=0):
+        policy = self.retry_policy
         msg = response
         if isinstance(response, ConnectionError):
-            logging.warning("Got ConnectionError [%s] errno:%s on %s %s\n%s\n%s" % (
-                response, response.errno, request, url, vars(response), response.__dict__))
+            logging.warning("Got ConnectionError [%s] errno:%s on %s %s\n%s\n%s",
+                            response, response.errno, request, url, vars(response), response.__dict__)
+        if not policy.retryable(request, response):
+            return None
         if hasattr(response, 'status_code'):
-            if response.status_code in [502, 503, 504, 401]:
-                msg = "%s %s" % (response.status_code, response.reason)
-            elif not (response.status_code == 200 and
-                      len(response.content) == 0 and
-                      'X-Seraph-LoginReason' in response.headers and
-                      'AUTHENTICATED_FAILED' in response.headers['X-Seraph-LoginReason']):
-                return False
-            else:
-                msg = "Unknown error"
-
-        delay = min(60, 10 * 2 ** counter) * random.random()
-        logging.warning("Got recoverable error from %s %s, will retry [%s/%s] in %ss. Err: %s" % (
-            request, url, counter, self.max_retries, delay, msg))
-        time.sleep(delay)
-        return True
+            msg = "%s %s" % (response.status_code, response.reason)
+
+        delay = policy.delay(previous_delay, response)
+        if delay is None:
+            logging.warning("Not retrying %s %s: Retry-After exceeds %ss. Err: %s",
+                            request, url, policy.max_delay, msg)
+            return None
+        if not policy.allow_retry():
+            logging.warning("Not retrying %s %s: retry budget exhausted. Err: %s",
+                            request, url, msg)
+            return None
+        logging.warning("Got recoverable error from %s %s, will retry [%s/%s] in %ss. Err: %s",
+                        request, url, counter, self.max_retries, delay, msg)
+        if self.instrumentation is not None:
+            self.instrumentation.retry(request, url, counter, delay)
+        self.sleep(delay)
+        return delay
 
     def __verb(self, verb, url, retry_data=None, **kwargs):
 
@@ -93,28 +83,36 @@ class ResilientSession(Session):
         d.update(kwargs.get('headers', {}))
         kwargs['headers'] = d
 
-        data = kwargs.get('data', {})
-        if isinstance(data, dict):
-            data = json.dumps(data)
+        if isinstance(kwargs.get('data'), dict):
+            kwargs['data'] = jsoncodec.dumps(kwargs['data'])
 
+        started = time.time()
+        try:
+            return self.__attempt(verb, url, retry_data, kwargs)
+        finally:
+            self.retry_policy.record(time.time() - started)
+
+    def __attempt(self, verb, url, retry_data, kwargs):
         retry_number = 0
+        delay = 0
         while retry_number <= self.max_retries:
             response = None
             exception = None
             try:
                 method = getattr(super(ResilientSession, self), verb.lower())
-                response = method(url, timeout=self.timeout, **kwargs)
-                if response.status_code == 200:
+                response = self.__send(verb.upper(), method, url, kwargs)
+                # 304 only answers the conditional requests made for the cache
+                if response.status_code in (200, 304):
                     return response
             except ConnectionError as e:
-                logging.warning(
-                    "%s while doing %s %s [%s]" % (e, verb.upper(), url, kwargs))
+                logging.warning("%s while doing %s %s [%s]", e, verb.upper(), url, kwargs)
                 exception = e
             retry_number += 1
 
             if retry_number <= self.max_retries:
                 response_or_exception = response if response is not None else exception
-                if self.__recoverable(response_or_exception, url, verb.upper(), retry_number):
+                delay = self.__recoverable(response_or_exception, url, verb.upper(), retry_number, delay)
+                if delay is not None:
                     if retry_data:
                         kwargs['data'] = retry_data()
                     continue
@@ -126,23 +124,101 @@ class ResilientSession(Session):
         raise_on_error(response, verb=verb, **kwargs)
         return response
 
+    def __send(self, verb, method, url, kwargs):
+        if self.replayer is not None:
+            method = lambda url, **_: self.replayer.replay(verb, url, kwargs)
+        elif self.recorder is not None:
+            method = self.__recording(verb, method, kwargs)
+        if self.in_flight_limit is not None:
+            method = self.__limited(method)
+
+        hooks = self.instrumentation
+        limiter = self.rate_limiter
+        if hooks is None and limiter is None:
+            return method(url, timeout=self.timeout, **kwargs)
+
+        if hooks is not None:
+            hooks.before_request(verb, url, kwargs)
+        if limiter is not None:
+            limiter.acquire()
+        started = time.time()
+        response = None
+        exception = None
+        try:
+            response = method(url, timeout=self.timeout, **kwargs)
+            return response
+        except Exception as e:
+            exception = e
+            raise
+        finally:
+            elapsed = time.time() - started
+            if limiter is not None:
+                limiter.release(response.status_code if response is not None else None, elapsed)
+            if hooks is not None:
+                if response is not None:
+                    # Lets json_loads report decode time for this response.
+                    response.instrumentation = hooks
+                hooks.after_request(verb, url, response, elapsed, exception)
+
+    def __limited(self, method):
+        def send(url, **send_kwargs):
+            with self.in_flight_limit:
+                return method(url, **send_kwargs)
+        return send
+
+    def __recording(self, verb, method, kwargs):
+        def send(url, **send_kwargs):
+            started = time.time()
+            response = method(url, **send_kwargs)
+            self.recorder.record(verb, url, kwargs, response, time.time() - started)
+            return response
+        return send
+
+    def __write(self, verb, url, **kwargs):
+        response = self.__verb(verb, url, **kwargs)
+        if self.cache is not None:
+            self.cache.clear()
+        return response
+
     def get(self, url, **kwargs):
-        return self.__verb('GET', url, **kwargs)
+        # Streamed bodies can only be read once, so they are never shared.
+        if self.single_flight is None or kwargs.get('stream'):
+            return self.__get(url, **kwargs)
+
+        user = self.auth[0] if isinstance(self.auth, tuple) else None
+        key = self.single_flight.key(url, kwargs.get('params'), user, kwargs.get('headers'))
+        response, shared = self.single_flight.do(key, lambda: self.__get(url, **kwargs))
+        if shared and self.instrumentation is not None:
+            self.instrumentation.coalesced('GET', url)
+        return response
+
+    def __get(self, url, **kwargs):
+        # Caching would buffer the whole body of a streamed response.
+        if self.cache is None or kwargs.get('stream'):
+            return self.__verb('GET', url, **kwargs)
+
+        user = self.auth[0] if isinstance(self.auth, tuple) else None
+        key = self.cache.key(url, kwargs.get('params'), user)
+
+        def fetch(headers):
+            kwargs['headers'] = headers
+            return self.__verb('GET', url, **kwargs)
+        return self.cache.get(key, fetch, kwargs.get('headers'))
 
     def post(self, url, **kwargs):
-        return self.__verb('POST', url, **kwargs)
+        return self.__write('POST', url, **kwargs)
 
     def put(self, url, **kwargs):
-        return self.__verb('PUT', url, **kwargs)
+        return self.__write('PUT', url, **kwargs)
 
     def delete(self, url, **kwargs):
-        return self.__verb('DELETE', url, **kwargs)
+        return self.__write('DELETE', url, **kwargs)
 
     def head(self, url, **kwargs):
         return self.__verb('HEAD', url, **kwargs)
 
     def patch(self, url, **kwargs):
-        return self.__verb('PATCH', url, **kwargs)
+        return self.__write('PATCH', url, **kwargs)
 
     def options(self, url, **kwargs):
         return self.__verb('OPTIONS', url, **kwargs)
@@ -1,8 +1,10 @@
 import logging
 
 import re
-from six import iteritems
+import threading
+import time
 
+from bitbucket.cache import MemoryCache
 from bitbucket.exceptions import BitbucketError
 
 try:  # Python 2.7+
@@ -13,10 +15,12 @@ except ImportError:
         def emit(self, record):
             pass
 
-from bitbucket.utils import CaseInsensitiveDict, json_loads
+from bitbucket.utils import CaseInsensitiveDict, iter_pages, json_loads, url_template
 
 logging.getLogger('bitbucket').addHandler(NullHandler())
 
+MERGE_MESSAGE_RE = re.compile(r'Merge pull request #(\d+) ')
+
 __all__ = ('Repo',
            'Project',
            'Resource',
@@ -24,43 +28,211 @@ __all__ = ('Repo',
            'User')
 
 
+def shared_resource(resource_cls, href, options, session, raw):
+    """Return the client's instance for ``href``, creating it from raw if needed."""
+    identity_map = getattr(session, 'identity_map', None)
+    if identity_map is None:
+        return resource_cls(options, session, raw)
+    key = identity_map.key_for(href)
+    resource = identity_map.get(key)
+    if resource is None:
+        resource = resource_cls(options, session, raw)
+        identity_map.set(key, resource)
+    return resource
+
+
+def value2resource(value, options=None, session=None):
+    if isinstance(value, dict):
+        if 'self' in value:
+            # A ``links`` dict: it names a resource but is not one, so it is
+            # never shared through the identity map.
+            return cls_for_resource(value['self'])(options, session, value)
+        elif value.has_key('links') and value['links'].has_key('self'):
+            links = value['links']['self']
+        else:
+            return dict2resource(value, options=options, session=session)
+        return shared_resource(cls_for_resource(links), links[0]['href'], options, session, value)
+    elif isinstance(value, (tuple, list, set, frozenset)):
+        return [value2resource(elem, options, session) if isinstance(elem, dict) else elem
+                for elem in value]
+    return value
+
+
 def dict2resource(raw, top=None, options=None, session=None):
     if top is None:
         top = PropertyHolder(raw)
 
-    seqs = tuple, list, set, frozenset
-    for i, j in iteritems(raw):
-        if isinstance(j, dict):
-            if 'self' in j:
-                resource = cls_for_resource(j['self'])(options, session, j)
-                setattr(top, i, resource)
-            elif j.has_key('links') and j['links'].has_key('self'):
-                resource = cls_for_resource(j['links']['self'])(options, session, j)
-                setattr(top, i, resource)
+    for i, j in raw.iteritems():
+        setattr(top, i, value2resource(j, options, session))
+    return top
+
+
+def find_resource(resource_cls, options, session, ids, expand=None):
+    resource = resource_cls(options, session)
+    params = {}
+    if expand is not None:
+        params['expand'] = expand
+
+    identity_map = getattr(session, 'identity_map', None)
+    if identity_map is not None:
+        key = identity_map.key_for(resource._url_for(ids))
+        cached = identity_map.get(key)
+        if cached is not None:
+            return cached
+
+    resource.find(id=ids, params=params)
+    if not resource:
+        raise BitbucketError("Unable to find resource %s(%s)", resource_cls, ids)
+    if identity_map is not None:
+        identity_map.set(key, resource)
+    return resource
+
+
+def iter_resources(resource_cls, options, session, url, params, page_size=None, prefetch=None,
+                   compact=False):
+    if page_size is None and 'limit' not in params:
+        page_size = options.get('page_size')
+    if prefetch is None:
+        prefetch = options.get('prefetch_pages', 0)
+    record_cls = compact_record_classes[resource_cls] if compact else None
+    identity_map = getattr(session, 'identity_map', None)
+    stream = options.get('stream_listings', False)
+    store = getattr(session, 'store', None)
+    for page in iter_pages(session, url, params, page_size, prefetch, stream):
+        if store is not None:
+            page = list(page)  # streamed pages are generators
+            store.record(resource_cls, url, page)
+        for raw in page:
+            if record_cls is not None:
+                yield record_cls.from_raw(options, session, url, raw)
+            elif identity_map is not None and 'links' in raw and 'self' in raw['links']:
+                # Listings carry fresh state, so shared instances are updated.
+                resource = shared_resource(resource_cls, raw['links']['self'][0]['href'],
+                                           options, session, raw)
+                if resource.raw is not raw:
+                    resource._parse_raw(raw)
+                yield resource
             else:
-                setattr(
-                    top, i, dict2resource(j, options=options, session=session))
-        elif isinstance(j, seqs):
-            seq_list = []
-            for seq_elem in j:
-                if isinstance(seq_elem, dict):
-                    if 'self' in seq_elem:
-                        resource = cls_for_resource(seq_elem['self'])(
-                            options, session, seq_elem)
-                        seq_list.append(resource)
-                    elif seq_elem.has_key('links') and seq_elem['links'].has_key('self'):
-                        resource = cls_for_resource(seq_elem['links']['self'])(
-                            options, session, seq_elem)
-                        seq_list.append(resource)
-                    else:
-                        seq_list.append(
-                            dict2resource(seq_elem, options=options, session=session))
-                else:
-                    seq_list.append(seq_elem)
-            setattr(top, i, seq_list)
+                yield resource_cls(options, session, raw)
+
+
+class IdentityMap(MemoryCache):
+    """Bounded map from canonical resource href to the client's shared instance.
+
+    UI links (``.../projects/P/repos/r/browse``) and REST urls
+    (``.../rest/api/1.0/projects/P/repos/r``) of a resource share a key.
+    """
+
+    @staticmethod
+    def key_for(href):
+        path = href.split('?', 1)[0].split('#', 1)[0].rstrip('/')
+        api = path.find('/rest/api/')
+        if api != -1:
+            version_end = path.find('/', api + len('/rest/api/'))
+            path = path[:api] + (path[version_end:] if version_end != -1 else '')
+        if path.endswith('/browse'):
+            path = path[:-len('/browse')]
+        return path
+
+    def invalidate(self, href):
+        self.delete(self.key_for(href))
+
+
+class MergeCommitIndex(object):
+    """Incremental pull request id -> merge commit index of one repository.
+
+    Merge history is read newest first and only as far back as a lookup
+    needs. Lookups of ids not indexed yet first pick up the merges made since
+    the newest indexed commit, at most once per ``refresh_interval`` seconds,
+    so pull requests without a merge commit do not cost a request each.
+    Entries are the raw commit JSON.
+    """
+
+    REFRESH_INTERVAL = 5.0
+
+    def __init__(self, session, url, page_size=None, refresh_interval=REFRESH_INTERVAL):
+        self._session = session
+        self._url = url
+        self._page_size = page_size
+        self.refresh_interval = refresh_interval
+        self._commits = {}
+        self._newest = None
+        self._next_start = 0
+        self._refreshed_at = None  # when the newest merges were last read
+        self._lock = threading.Lock()
+
+    def _index(self, raw_commit_json, replace=False):
+        match = MERGE_MESSAGE_RE.match(raw_commit_json.get('message', ''))
+        if match:
+            pr_id = int(match.group(1))
+            if replace or pr_id not in self._commits:
+                self._commits[pr_id] = raw_commit_json
+
+    def _refresh(self):
+        newest = None
+        added = 0
+        params = {'merges': 'only'}
+        for page in iter_pages(self._session, self._url, params, self._page_size):
+            if getattr(self._session, 'store', None) is not None:
+                self._session.store.record(Commit, self._url, page)
+            for raw_commit_json in page:
+                if raw_commit_json['id'] == self._newest:
+                    break
+                if newest is None:
+                    newest = raw_commit_json['id']
+                self._index(raw_commit_json, replace=True)
+                added += 1
+            else:
+                continue
+            break
+        if newest is not None:
+            self._newest = newest
+        self._refreshed_at = time.time()
+        # New merges push the unread part of history further down the listing.
+        if self._next_start is not None:
+            self._next_start += added
+
+    def _read_older(self):
+        params = {'merges': 'only', 'start': self._next_start}
+        if self._page_size is not None:
+            params['limit'] = self._page_size
+        r_json = json_loads(self._session.get(self._url, params=params))
+        if getattr(self._session, 'store', None) is not None:
+            self._session.store.record(Commit, self._url, r_json.get('values'))
+        if self._refreshed_at is None:
+            self._refreshed_at = time.time()
+        for raw_commit_json in r_json.get('values', []):
+            if self._newest is None:
+                self._newest = raw_commit_json['id']
+            self._index(raw_commit_json)
+        if r_json.get('isLastPage', True) or r_json.get('nextPageStart') is None:
+            self._next_start = None
         else:
-            setattr(top, i, j)
-    return top
+            self._next_start = r_json['nextPageStart']
+
+    def expire(self):
+        """Make the next lookup miss pick up new merges, e.g. after merging."""
+        self._refreshed_at = 0 if self._refreshed_at is not None else None
+
+    def refresh(self):
+        """Pick up the merges made since history was last read."""
+        with self._lock:
+            if self._refreshed_at is not None:
+                self._refresh()
+
+    def get(self, pr_id, refresh=True):
+        """The merge commit of ``pr_id`` or None. With ``refresh`` False, merges
+        newer than the last read are not looked for.
+        """
+        with self._lock:
+            if pr_id in self._commits:
+                return self._commits[pr_id]
+            if refresh and self._refreshed_at is not None and \
+                    time.time() - self._refreshed_at >= self.refresh_interval:
+                self._refresh()
+            while pr_id not in self._commits and self._next_start is not None:
+                self._read_older()
+            return self._commits.get(pr_id)
 
 
 class Resource(object):
@@ -76,34 +248,25 @@ class Resource(object):
         self.raw = None
 
     def __getattr__(self, item):
+        # Lazily parsed resources materialize attributes from raw on first use.
+        raw = self.__dict__.get('raw')
+        if raw and item in raw:
+            value = value2resource(raw[item], self._options, self._session)
+            setattr(self, item, value)
+            return value
 
-        print "Item: %s" % item
         try:
             return self[item]
         except Exception as e:
             if item == '__getnewargs__':
                 raise KeyError(item)
-
-            if hasattr(self, 'raw') and item in self.raw:
-                return self.raw[item]
-            else:
-                raise AttributeError('%r object has no attribute %r (%s)' % (self.__class__, item, e))
+            raise AttributeError('%r object has no attribute %r (%s)' % (self.__class__, item, e))
 
     def _get_url(self, path):
-        options = self._options.copy()
-        options.update({'path': path})
-        return self._base_url.format(**options)
+        return url_template(self._base_url).expand(self._options, path)
 
     def _find_for_resource(self, resource_cls, ids, expand=None):
-        # print ids
-        resource = resource_cls(self._options, self._session)
-        params = {}
-        if expand is not None:
-            params['expand'] = expand
-        resource.find(id=ids, params=params)
-        if not resource:
-            raise BitbucketError("Unable to find resource %s(%s)", resource_cls, ids)
-        return resource
+        return find_resource(resource_cls, self._options, self._session, ids, expand)
 
     def _load(self,
               url,
@@ -114,11 +277,13 @@ class Resource(object):
         try:
             j = json_loads(r)
         except ValueError as e:
-            logging.error("%s:\n%s" % (e, r.text))
+            logging.error("%s:\n%s", e, r.text)
             raise e
 
         if path:
             j = j[path]
+        if getattr(self._session, 'store', None) is not None:
+            self._session.store.record(type(self), url, [j])
         self._parse_raw(j)
 
     def find(self,
@@ -129,19 +294,39 @@ class Resource(object):
         if params is None:
             params = {}
 
-        # print self._resource
+        self._load(self._url_for(id), params=params)
+
+    def _url_for(self, id):
         if isinstance(id, tuple):
             path = self._resource.format(*id)
         else:
             path = self._resource.format(id)
-        url = self._get_url(path)
-        self._load(url, params=params)
+        return self._get_url(path)
 
     def _parse_raw(self, raw):
+        previous = self.raw
         self.raw = raw
         if not raw:
             raise NotImplementedError("We cannot instantiate empty resources: %s" % raw)
-        dict2resource(raw, self, self._options, self._session)
+        if not (self._options and self._options.get('lazy_resources')):
+            dict2resource(raw, self, self._options, self._session)
+        elif previous:
+            # Drop attributes materialized from the previous payload.
+            for key in previous:
+                self.__dict__.pop(key, None)
+
+    def _iter_resources(self, resource_cls, url, params, page_size=None, prefetch=None,
+                        compact=False):
+        return iter_resources(resource_cls, self._options, self._session, url, params,
+                              page_size, prefetch, compact)
+
+    def _merge_commit_index(self, url):
+        indexes = self._session.merge_commit_indexes
+        index = indexes.get(url)
+        if index is None:
+            index = indexes.setdefault(
+                url, MergeCommitIndex(self._session, url, self._options.get('page_size')))
+        return index
 
     def _default_headers(self, user_headers):
         return CaseInsensitiveDict(self._options['headers'].items() + user_headers.items())
@@ -156,13 +341,17 @@ class PullRequest(Resource):
     def can_merge(self, **params):
 
         if self.state == 'MERGED':
-            commit = self.get_merge_commit()
-            if isinstance(commit, Commit):
-                commit_id = commit.displayId
-            else:
-                commit_id = 'Failed to fetch commitID'
-            return {'canMerge': False, 'reason': 'Already merged', 'commit': commit_id}
+            return self._merged_status(self.get_merge_commit())
+        return self._check_merge(params)
 
+    def _merged_status(self, commit):
+        if isinstance(commit, Commit):
+            commit_id = commit.displayId
+        else:
+            commit_id = 'Failed to fetch commitID'
+        return {'canMerge': False, 'reason': 'Already merged', 'commit': commit_id}
+
+    def _check_merge(self, params):
         unapproved = True
         for self.reviewer in self.reviewers:
             if self.reviewer.status == 'APPROVED':
@@ -187,26 +376,22 @@ class PullRequest(Resource):
         return {'canMerge': True, 'reason': ''}
 
     def get_merge_commit(self, **params):
-        target_commit = None
         uri = 'projects/{0}/repos/{1}/commits'.format(self.fromRef.repository.project.name,
                                                       self.fromRef.repository.name)
         url = self._get_url(uri)
 
-        if not params:
-            params['merges'] = 'only'
-            params['limit'] = 1000
+        if params:
+            r_json = json_loads(self._session.get(url, params=params))
+            msg = 'Merge pull request #{0} '.format(self.id)
+            for raw_commit_json in r_json['values']:
+                if raw_commit_json.get('message', '').startswith(msg):
+                    return Commit(self._options, self._session, raw_commit_json)
+            return None
 
-        r_json = json_loads(self._session.get(url, params=params))
-        # print r_json
-        commits = [Commit(self._options, self._session, raw_commit_json)
-                         for raw_commit_json in r_json['values']]
-
-        msg = 'Merge pull request #{0} '.format(self.id)
-        for commit in commits:
-            if commit.message.startswith(msg):
-                target_commit = commit
-                break
-        return target_commit
+        raw_commit_json = self._merge_commit_index(url).get(self.id)
+        if raw_commit_json is None:
+            return None
+        return Commit(self._options, self._session, raw_commit_json)
 
     def merge(self):
         uri = 'projects/{}/repos/{}/pull-requests/{}/merge'.format(self.fromRef.repository.project.name,
@@ -215,6 +400,13 @@ class PullRequest(Resource):
         url = self._get_url(uri)
         params = {'version': self.version}
         r_json = json_loads(self._session.post(url, params=params))
+        if self._session.identity_map is not None:
+            self._session.identity_map.invalidate(url[:-len('/merge')])
+        index = self._session.merge_commit_indexes.get(self._get_url(
+            'projects/{0}/repos/{1}/commits'.format(self.fromRef.repository.project.name,
+                                                    self.fromRef.repository.name)))
+        if index is not None:
+            index.expire()
         commit = Commit(self._options, self._session, r_json)
         return commit
 
@@ -226,39 +418,76 @@ class Repo(Resource):
         if raw:
             self._parse_raw(raw)
 
+    def _pull_requests_url(self):
+        return self._get_url('projects/{}/repos/{}/pull-requests'.format(self.project.name, self.name))
+
+    def iter_pull_requests(self, page_size=None, prefetch=None, compact=False, **params):
+        url = self._pull_requests_url()
+        return self._iter_resources(PullRequest, url, params, page_size, prefetch, compact)
+
     def pull_requests(self, **params):
-        uri = 'projects/{}/repos/{}/pull-requests'.format(self.project.name, self.name)
-        url = self._get_url(uri)
         if not params:
             params = {'state': 'merged', 'limit': 1000}
-        r_json = json_loads(self._session.get(url, params=params))
-        # print r_json
-        pull_requests = [PullRequest(self._options, self._session, raw_repo_json)
-                         for raw_repo_json in r_json['values']]
-
-        return pull_requests
+        return list(self.iter_pull_requests(**params))
 
-    def latest_merge_commit(self, **params):
+    def iter_commits(self, page_size=None, prefetch=None, compact=False, **params):
         uri = 'projects/{0}/repos/{1}/commits'.format(self.project.name,
                                                       self.name)
         url = self._get_url(uri)
+        return self._iter_resources(Commit, url, params, page_size, prefetch, compact)
 
+    def latest_merge_commit(self, **params):
         if not params:
             params['merges'] = 'only'
-            params['limit'] = 1000
+        params['limit'] = 1
 
-        r_json = json_loads(self._session.get(url, params=params))
-        # print r_json
-        commits = [Commit(self._options, self._session, raw_commit_json)
-                         for raw_commit_json in r_json['values']]
-
-        if commits:
-            target_commit = commits[0]
-        else:
+        target_commit = next(self.iter_commits(prefetch=0, **params), None)
+        if target_commit is None:
             target_commit = {'status': 'Failed', 'reason': 'No merges so far'}
 
         return target_commit
 
+    def merge_commit_index(self):
+        uri = 'projects/{0}/repos/{1}/commits'.format(self.project.name,
+                                                      self.name)
+        return self._merge_commit_index(self._get_url(uri))
+
+    def can_merge_many(self, pull_requests, workers=8, **params):
+        """Evaluate ``can_merge`` for many pull requests of this repo at once.
+
+        Merged pull requests share the repo's merge-commit index, so history
+        is read at most once (new merges are picked up once per call). The
+        ``/merge`` checks of open ones run concurrently on a pool of up to
+        ``workers`` threads that lives for the duration of the call; the
+        client's worker pool is never used, so this can itself run on it.
+        Returns a dict keyed by pull request id.
+        """
+        pull_requests = list(pull_requests)
+        index = self.merge_commit_index()
+        if any(pr.state == 'MERGED' for pr in pull_requests):
+            index.refresh()
+
+        def check(pr):
+            if pr.state == 'MERGED':
+                raw_commit_json = index.get(pr.id, refresh=False)
+                commit = None
+                if raw_commit_json is not None:
+                    commit = Commit(self._options, self._session, raw_commit_json)
+                return pr._merged_status(commit)
+            return pr._check_merge(dict(params))
+
+        open_count = sum(1 for pr in pull_requests if pr.state != 'MERGED')
+        if workers > 1 and open_count > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(workers, open_count))
+            try:
+                results = pool.map(check, pull_requests)
+            finally:
+                pool.terminate()
+        else:
+            results = [check(pr) for pr in pull_requests]
+        return dict((pr.id, result) for pr, result in zip(pull_requests, results))
+
     def pull_request(self, id):
         _id = (self.project.name, self.name, id)
         return self._find_for_resource(PullRequest, _id)
@@ -289,15 +518,14 @@ class Project(Resource):
         if raw:
             self._parse_raw(raw)
 
+    def iter_repos(self, page_size=None, prefetch=None, compact=False, **params):
+        url = self._get_url('projects/{}/repos'.format(self.name))
+        return self._iter_resources(Repo, url, params, page_size, prefetch, compact)
+
     def repos(self, **params):
-        url = self._options['server'] + '/rest/api/1.0/projects/{}/repos'.format(self.name)
         if not params:
             params = {'limit': 1000}
-        r_json = json_loads(self._session.get(url, params=params))
-        repos = [Repo(self._options, self._session, raw_repo_json)
-                 for raw_repo_json in r_json['values']]
-
-        return repos
+        return list(self.iter_repos(**params))
 
     def repo(self, id):
         # self._resource = 'projects/{}/repos/{}'.format(self.name, id)
@@ -312,21 +540,179 @@ class UnknownResource(Resource):
             self._parse_raw(raw)
 
 
+class ResourceResolver(object):
+    """Maps resource hrefs to Resource classes.
+
+    Patterns are slash separated path suffixes where ``*`` stands for exactly
+    one non-empty segment, e.g. ``projects/*/repos/*/browse``. They are kept
+    in a trie of reversed segments, so a lookup walks the href from its last
+    segment. Literal segments win over ``*`` and longer patterns over shorter
+    ones, which makes the result independent of registration order. Results
+    are memoized per href.
+    """
+
+    WILDCARD = '*'
+    MAX_CACHED = 10000
+
+    def __init__(self, default=None):
+        self.default = default
+        self._trie = {}
+        self._cache = {}
+
+    def register(self, pattern, resource_cls):
+        node = self._trie
+        for segment in reversed(pattern.strip('/').split('/')):
+            node = node.setdefault(segment, {})
+        node[None] = resource_cls
+        self._cache = {}
+
+    def _match(self, node, segments, i):
+        best = (0, node.get(None))
+        if i < 0 or not segments[i]:
+            return best
+        for key in (segments[i], self.WILDCARD):
+            child = node.get(key)
+            if child is not None:
+                depth, resource_cls = self._match(child, segments, i - 1)
+                if resource_cls is not None and depth + 1 > best[0]:
+                    best = (depth + 1, resource_cls)
+        return best
+
+    def resolve(self, href):
+        try:
+            return self._cache[href]
+        except KeyError:
+            pass
+        segments = href.split('?', 1)[0].split('#', 1)[0].split('/')
+        resource_cls = self._match(self._trie, segments, len(segments) - 1)[1] or self.default
+        if len(self._cache) >= self.MAX_CACHED:
+            self._cache = {}
+        self._cache[href] = resource_cls
+        return resource_cls
+
+
+resource_resolver = ResourceResolver(default=UnknownResource)
+resource_resolver.register('projects/*', Project)
+resource_resolver.register('users/*', User)
+resource_resolver.register('projects/*/repos/*/browse', Repo)
+resource_resolver.register('projects/*/repos/*/pull-requests/*', PullRequest)
+
+
+def register_resource_class(pattern, resource_cls):
+    resource_resolver.register(pattern, resource_cls)
+
+
+# Regular expressions used before ResourceResolver. Entries added to or
+# replaced in this map are still honoured, ahead of the resolver.
 resource_class_map = {
     r'projects/[^/]+$': Project,
     r'users/[^/]+$': User,
     r'projects/[^/]+/repos/[^/]+/browse$': Repo,
     r'projects/[^/]+/repos/[^/]+/pull-requests/[^/]+$': PullRequest,
 }
+_default_class_map = dict(resource_class_map)
 
 
 def cls_for_resource(resource):
-    resource_literal = resource[0]['href']
-    for resource in resource_class_map:
-        if re.search(resource, resource_literal):
-            return resource_class_map[resource]
-    else:
-        return UnknownResource
+    href = resource[0]['href']
+    if resource_class_map != _default_class_map:
+        for pattern, resource_cls in resource_class_map.items():
+            if _default_class_map.get(pattern) is not resource_cls and re.search(pattern, href):
+                return resource_cls
+    return resource_resolver.resolve(href)
+
+
+class Record(object):
+    """Compact, read-only view of a listed resource for bulk use.
+
+    Only the fields named in ``FIELDS`` are kept, in slots, and the raw JSON
+    is dropped. ``hydrate()`` fetches the full resource when it is needed.
+    """
+    __slots__ = ('_url', '_options', '_session')
+
+    # (attribute, path into the raw JSON) pairs
+    FIELDS = ()
+    KEY = 'id'
+    resource_cls = None
+
+    def __init__(self, options, session, url, *values):
+        self._options = options
+        self._session = session
+        self._url = url
+        for (name, _), value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_raw(cls, options, session, listing_url, raw):
+        values = []
+        for _, path in cls.FIELDS:
+            value = raw
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            values.append(value)
+        return cls(options, session, '{0}/{1}'.format(listing_url, raw[cls.KEY]), *values)
+
+    def hydrate(self):
+        resource = self.resource_cls(self._options, self._session)
+        resource._load(self._url)
+        return resource
+
+    def __repr__(self):
+        return '<%s %s=%r>' % (self.__class__.__name__, self.KEY, getattr(self, self.KEY))
+
+
+class PullRequestRecord(Record):
+    FIELDS = (('id', ('id',)),
+              ('version', ('version',)),
+              ('title', ('title',)),
+              ('state', ('state',)),
+              ('author', ('author', 'user', 'name')),
+              ('createdDate', ('createdDate',)),
+              ('updatedDate', ('updatedDate',)),
+              ('closedDate', ('closedDate',)))
+    __slots__ = tuple(name for name, _ in FIELDS)
+    resource_cls = PullRequest
+
+
+class CommitRecord(Record):
+    FIELDS = (('id', ('id',)),
+              ('displayId', ('displayId',)),
+              ('message', ('message',)),
+              ('author', ('author', 'name')),
+              ('authorTimestamp', ('authorTimestamp',)),
+              ('committerTimestamp', ('committerTimestamp',)))
+    __slots__ = tuple(name for name, _ in FIELDS)
+    resource_cls = Commit
+
+
+class RepoRecord(Record):
+    FIELDS = (('id', ('id',)),
+              ('slug', ('slug',)),
+              ('name', ('name',)),
+              ('state', ('state',)),
+              ('project', ('project', 'key')))
+    __slots__ = tuple(name for name, _ in FIELDS)
+    KEY = 'slug'
+    resource_cls = Repo
+
+
+class UserRecord(Record):
+    FIELDS = (('id', ('id',)),
+              ('name', ('name',)),
+              ('slug', ('slug',)),
+              ('displayName', ('displayName',)),
+              ('emailAddress', ('emailAddress',)))
+    __slots__ = tuple(name for name, _ in FIELDS)
+    KEY = 'slug'
+    resource_cls = User
+
+
+compact_record_classes = {
+    PullRequest: PullRequestRecord,
+    Commit: CommitRecord,
+    Repo: RepoRecord,
+    User: UserRecord,
+}
 
 
 class PropertyHolder(object):
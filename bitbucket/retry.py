@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+
+from requests.exceptions import ConnectTimeout
+
+from bitbucket.exceptions import retry_after
+
+
+class RetryBudget(object):
+    """Caps retries at a fraction of the requests made.
+
+    Every request deposits ``ratio`` tokens and every retry withdraws one, so
+    during a brownout retries add at most ``ratio`` extra load. A trickle of
+    ``min_per_second`` tokens keeps rarely used clients able to retry.
+    Share one budget between clients to make it process-wide.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=1.0, max_tokens=100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self, tokens):
+        now = time.time()
+        tokens += (now - self._updated) * self.min_per_second
+        self._updated = now
+        self._tokens = min(self.max_tokens, self._tokens + tokens)
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            self._refill(0)
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """Decides whether and when ResilientSession retries a request.
+
+    Idempotent verbs are retried on connection errors and on
+    ``retry_statuses``. Other verbs (POST, PATCH) are only retried when the
+    server cannot have acted on them: a 429 or a failure to connect.
+    ``Retry-After`` is honoured; otherwise delays use decorrelated jitter
+    between ``base_delay`` and ``max_delay``.
+    """
+
+    IDEMPOTENT_VERBS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+    RETRY_STATUSES = frozenset([401, 429, 502, 503, 504])
+
+    def __init__(self,
+                 max_retries=3,
+                 base_delay=10,
+                 max_delay=60,
+                 retry_statuses=RETRY_STATUSES,
+                 idempotent_verbs=IDEMPOTENT_VERBS,
+                 budget=None,
+                 ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.idempotent_verbs = frozenset(idempotent_verbs)
+        self.budget = budget
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def retryable(self, verb, response):
+        """Return True if the failed attempt may be repeated."""
+        if response is None:
+            return False
+        status_code = getattr(response, 'status_code', None)
+        if status_code is None:
+            # A connection error: only safe to repeat if nothing was sent.
+            return verb in self.idempotent_verbs or isinstance(response, ConnectTimeout)
+        if status_code == 429:
+            return True
+        if status_code in self.retry_statuses:
+            return verb in self.idempotent_verbs
+        return (verb in self.idempotent_verbs and
+                status_code == 200 and
+                len(response.content) == 0 and
+                'AUTHENTICATED_FAILED' in response.headers.get('X-Seraph-LoginReason', ''))
+
+    retry_after = staticmethod(retry_after)
+
+    def delay(self, previous_delay, response=None):
+        """Seconds to wait before the next attempt, or None to give up."""
+        wait = self.retry_after(response)
+        if wait is not None:
+            return wait if wait <= self.max_delay else None
+        # Decorrelated jitter; the first retry counts as following a base_delay
+        # wait, so even it is spread over [base_delay, 3 * base_delay].
+        upper = max(self.base_delay, previous_delay) * 3
+        return min(self.max_delay, random.uniform(self.base_delay, upper))
+
+    def allow_retry(self):
+        if self.budget is not None and not self.budget.withdraw():
+            with self._lock:
+                self.budget_exhausted += 1
+            return False
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def record(self, elapsed):
+        if self.budget is not None:
+            self.budget.deposit()
+        with self._lock:
+            self.requests += 1
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'budget_exhausted': self.budget_exhausted,
+                'latency_total': self.latency_total,
+                'latency_max': self.latency_max,
+                'latency_mean': self.latency_total / self.requests if self.requests else 0.0,
+            }
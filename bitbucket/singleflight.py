@@ -0,0 +1,72 @@
+import json
+import sys
+import threading
+
+from six import reraise
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'exc_info')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """Runs at most one call per key at a time.
+
+    Callers arriving while a call for their key is in flight wait for it and
+    share its result (or exception) instead of making their own. Nothing is
+    kept once the call returns, so this is not a cache.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url, params=None, user=None, headers=None):
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        headers = sorted(dict(headers or {}).items())
+        return json.dumps([user, url, params, headers])
+
+    def do(self, key, func):
+        """Return ``(result, shared)``; ``shared`` is True if another caller's
+        call was waited for.
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            if call is None:
+                call = self._in_flight[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.exc_info is not None:
+                reraise(*call.exc_info)
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced,
+                    'in_flight': len(self._in_flight)}
@@ -0,0 +1,204 @@
+import re
+import sqlite3
+import threading
+
+from bitbucket import jsoncodec
+from bitbucket.resources import MERGE_MESSAGE_RE, Commit, Project, PullRequest, Repo
+
+_REPO_URL_RE = re.compile(r'/projects/([^/]+)/repos/([^/?]+)')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS projects ('
+    ' key TEXT PRIMARY KEY, id INTEGER, name TEXT, raw TEXT)',
+    'CREATE TABLE IF NOT EXISTS repos ('
+    ' project_key TEXT, slug TEXT, id INTEGER, name TEXT, raw TEXT,'
+    ' PRIMARY KEY (project_key, slug))',
+    'CREATE INDEX IF NOT EXISTS repos_slug ON repos (slug)',
+    'CREATE TABLE IF NOT EXISTS pull_requests ('
+    ' project_key TEXT, repo_slug TEXT, id INTEGER, state TEXT, author TEXT,'
+    ' updated_date INTEGER, raw TEXT, PRIMARY KEY (project_key, repo_slug, id))',
+    'CREATE INDEX IF NOT EXISTS pull_requests_state'
+    ' ON pull_requests (project_key, repo_slug, state)',
+    'CREATE INDEX IF NOT EXISTS pull_requests_author ON pull_requests (author, state)',
+    'CREATE TABLE IF NOT EXISTS pull_request_reviewers ('
+    ' project_key TEXT, repo_slug TEXT, pull_request_id INTEGER, reviewer TEXT,'
+    ' PRIMARY KEY (project_key, repo_slug, pull_request_id, reviewer))',
+    'CREATE INDEX IF NOT EXISTS pull_request_reviewers_reviewer'
+    ' ON pull_request_reviewers (reviewer)',
+    'CREATE TABLE IF NOT EXISTS commits ('
+    ' project_key TEXT, repo_slug TEXT, id TEXT, merged_pull_request INTEGER,'
+    ' author_timestamp INTEGER, raw TEXT, PRIMARY KEY (project_key, repo_slug, id))',
+    'CREATE INDEX IF NOT EXISTS commits_merged_pull_request'
+    ' ON commits (project_key, repo_slug, merged_pull_request)',
+    'CREATE TABLE IF NOT EXISTS sync_watermarks ('
+    ' project_key TEXT, repo_slug TEXT, updated_date INTEGER, pull_request_id INTEGER,'
+    ' PRIMARY KEY (project_key, repo_slug))',
+)
+
+
+def _user_name(participant):
+    user = (participant or {}).get('user') or {}
+    return user.get('name') or user.get('slug')
+
+
+class ResourceStore(object):
+    """Local sqlite copy of the projects, repos, pull requests and commits the
+    client has fetched.
+
+    Pass it as ``Bitbucket(..., store=ResourceStore('bitbucket.db'))`` and
+    every listing page and ``find`` is written through, one transaction per
+    page. Queries answer from the copy without any requests and return raw
+    JSON dicts. It is also a store for PullRequestSync.
+    """
+
+    def __init__(self, path=':memory:'):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        for statement in SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+        self._writers = {
+            Project: self._write_projects,
+            Repo: self._write_repos,
+            PullRequest: self._write_pull_requests,
+            Commit: self._write_commits,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # Writing
+
+    def record(self, resource_cls, url, raws):
+        """Store the raw JSON of ``resource_cls`` objects fetched from ``url``."""
+        writer = self._writers.get(resource_cls)
+        if writer is None or not raws:
+            return
+        with self._lock:
+            writer(url, raws)
+            self._db.commit()
+
+    def _write_projects(self, url, raws):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?)',
+            [(raw['key'], raw.get('id'), raw.get('name'), jsoncodec.dumps(raw)) for raw in raws])
+
+    def _write_repos(self, url, raws):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO repos VALUES (?, ?, ?, ?, ?)',
+            [(raw['project']['key'], raw['slug'], raw.get('id'), raw.get('name'),
+              jsoncodec.dumps(raw)) for raw in raws])
+
+    def _write_pull_requests(self, url, raws):
+        rows, reviewers, keys = [], [], []
+        for raw in raws:
+            repository = raw['toRef']['repository']
+            key = (repository['project']['key'], repository['slug'], raw['id'])
+            keys.append(key)
+            rows.append(key + (raw.get('state'), _user_name(raw.get('author')),
+                               raw.get('updatedDate'), jsoncodec.dumps(raw)))
+            for reviewer in raw.get('reviewers', ()):
+                name = _user_name(reviewer)
+                if name:
+                    reviewers.append(key + (name,))
+        self._db.executemany(
+            'INSERT OR REPLACE INTO pull_requests VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        self._db.executemany(
+            'DELETE FROM pull_request_reviewers'
+            ' WHERE project_key = ? AND repo_slug = ? AND pull_request_id = ?', keys)
+        self._db.executemany(
+            'INSERT OR REPLACE INTO pull_request_reviewers VALUES (?, ?, ?, ?)', reviewers)
+
+    def _write_commits(self, url, raws):
+        match = _REPO_URL_RE.search(url)
+        if match is None:
+            return
+        project_key, repo_slug = match.groups()
+        rows = []
+        for raw in raws:
+            merged = MERGE_MESSAGE_RE.match(raw.get('message', ''))
+            rows.append((project_key, repo_slug, raw['id'],
+                         int(merged.group(1)) if merged else None,
+                         raw.get('authorTimestamp'), jsoncodec.dumps(raw)))
+        self._db.executemany('INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    # Queries
+
+    def _raws(self, sql, args=()):
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [jsoncodec.loads(row[0]) for row in rows]
+
+    def project(self, key):
+        return next(iter(self._raws('SELECT raw FROM projects WHERE key = ?', (key,))), None)
+
+    def repos(self, project_key=None, slug=None):
+        clauses, args = [], []
+        if project_key is not None:
+            clauses.append('project_key = ?')
+            args.append(project_key)
+        if slug is not None:
+            clauses.append('slug = ?')
+            args.append(slug)
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return self._raws('SELECT raw FROM repos' + where + ' ORDER BY project_key, slug', args)
+
+    def pull_requests(self, project_key=None, repo_slug=None, state=None, author=None):
+        """Pull requests matching all given filters, newest id first.
+
+        A single ``'PROJECT/slug'`` argument (as used by PullRequestSync) is
+        accepted too.
+        """
+        if repo_slug is None and project_key is not None and '/' in project_key:
+            project_key, repo_slug = project_key.split('/', 1)
+        clauses, args = [], []
+        for column, value in (('project_key', project_key), ('repo_slug', repo_slug),
+                              ('state', state), ('author', author)):
+            if value is not None:
+                clauses.append(column + ' = ?')
+                args.append(value)
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return self._raws('SELECT raw FROM pull_requests' + where + ' ORDER BY id DESC', args)
+
+    def pull_requests_by_reviewer(self, reviewer, state='OPEN'):
+        return self._raws(
+            'SELECT p.raw FROM pull_request_reviewers r JOIN pull_requests p'
+            ' ON p.project_key = r.project_key AND p.repo_slug = r.repo_slug'
+            ' AND p.id = r.pull_request_id'
+            ' WHERE r.reviewer = ? AND p.state = ? ORDER BY p.updated_date DESC',
+            (reviewer, state))
+
+    def merge_commit(self, project_key, repo_slug, pull_request_id):
+        return next(iter(self._raws(
+            'SELECT raw FROM commits WHERE project_key = ? AND repo_slug = ?'
+            ' AND merged_pull_request = ?', (project_key, repo_slug, pull_request_id))), None)
+
+    def merged_without_merge_commit(self, project_key, repo_slug):
+        """Merged pull requests of a repo whose merge commit is not stored."""
+        return self._raws(
+            'SELECT p.raw FROM pull_requests p WHERE p.project_key = ? AND p.repo_slug = ?'
+            " AND p.state = 'MERGED' AND NOT EXISTS (SELECT 1 FROM commits c"
+            ' WHERE c.project_key = p.project_key AND c.repo_slug = p.repo_slug'
+            ' AND c.merged_pull_request = p.id) ORDER BY p.id DESC',
+            (project_key, repo_slug))
+
+    # PullRequestSync store interface
+
+    def watermark(self, repo_key):
+        project_key, repo_slug = repo_key.split('/', 1)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT updated_date, pull_request_id FROM sync_watermarks'
+                ' WHERE project_key = ? AND repo_slug = ?', (project_key, repo_slug)).fetchone()
+        if row is None:
+            return None
+        return {'updatedDate': row[0], 'id': row[1]}
+
+    def apply(self, repo_key, pull_requests, watermark):
+        project_key, repo_slug = repo_key.split('/', 1)
+        with self._lock:
+            self._write_pull_requests(None, pull_requests)
+            self._db.execute('INSERT OR REPLACE INTO sync_watermarks VALUES (?, ?, ?, ?)',
+                             (project_key, repo_slug, watermark['updatedDate'], watermark['id']))
+            self._db.commit()
@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+
+from bitbucket.utils import iter_pages
+
+
+def repo_key(repo):
+    project = repo.project
+    return '%s/%s' % (getattr(project, 'key', None) or project.name,
+                      getattr(repo, 'slug', None) or repo.name)
+
+
+class JSONSyncStore(object):
+    """Pull request state and sync watermarks kept in one JSON file.
+
+    Suited to a few thousand pull requests; the whole file is rewritten
+    (atomically) on every applied change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {'watermarks': {}, 'pull_requests': {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._data = json.load(f)
+
+    def watermark(self, repo_key):
+        return self._data['watermarks'].get(repo_key)
+
+    def pull_requests(self, repo_key):
+        return list(self._data['pull_requests'].get(repo_key, {}).values())
+
+    def apply(self, repo_key, pull_requests, watermark):
+        with self._lock:
+            stored = self._data['pull_requests'].setdefault(repo_key, {})
+            for raw in pull_requests:
+                stored[str(raw['id'])] = raw
+            self._data['watermarks'][repo_key] = watermark
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self._data, f)
+            os.rename(tmp, self.path)
+
+
+class PullRequestSync(object):
+    """Fetches only the pull requests changed since the previous sync.
+
+    Pull requests are listed newest first (``order=NEWEST``, all states) and
+    paging stops at the repo's watermark: the ``updatedDate`` and id of the
+    newest pull request seen by the last run. Changes are handed to
+    ``store.apply`` together with the new watermark, so a failed run is
+    simply repeated from the old one.
+    """
+
+    def __init__(self, store, page_size=None):
+        self.store = store
+        self.page_size = page_size
+
+    def _changes(self, repo, watermark):
+        params = {'state': 'ALL', 'order': 'NEWEST'}
+        for page in iter_pages(repo._session, repo._pull_requests_url(), params, self.page_size):
+            for raw in page:
+                if watermark is not None:
+                    updated = raw.get('updatedDate', 0)
+                    if updated < watermark['updatedDate'] or \
+                            (updated == watermark['updatedDate'] and raw['id'] == watermark['id']):
+                        return
+                yield raw
+
+    def sync_repo(self, repo, full=False):
+        """Apply the changed pull requests of ``repo`` to the store and return them."""
+        key = repo_key(repo)
+        watermark = None if full else self.store.watermark(key)
+        changed = list(self._changes(repo, watermark))
+        if changed:
+            newest = max(changed, key=lambda raw: (raw.get('updatedDate', 0), raw['id']))
+            watermark = {'updatedDate': newest.get('updatedDate', 0), 'id': newest['id']}
+            self.store.apply(key, changed, watermark)
+        return changed
+
+    def sync(self, repos, full=False):
+        """Sync every repo; returns the number of changed pull requests per repo."""
+        return dict((repo_key(repo), len(self.sync_repo(repo, full))) for repo in repos)
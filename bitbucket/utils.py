@@ -1,5 +1,10 @@
+import codecs
 import json
-from bitbucket.exceptions import BitbucketError
+import re
+import time
+from operator import itemgetter
+from bitbucket import jsoncodec
+from bitbucket.exceptions import BitbucketError, error_class_for
 
 class CaseInsensitiveDict(dict):
 
@@ -16,6 +21,48 @@ class CaseInsensitiveDict(dict):
         """Overwrite [] implementation."""
         super(CaseInsensitiveDict, self).__setitem__(key.lower(), value)
 
+class URLTemplate(object):
+    """A ``str.format`` url template ending in ``{path}``.
+
+    The part before ``{path}`` is formatted once per distinct set of option
+    values and then reused, so expanding costs a few dict lookups and one
+    concatenation instead of copying the options and formatting.
+    """
+    __slots__ = ('template', 'head', 'fields', 'tail', '_key', '_heads')
+
+    def __init__(self, template):
+        self.template = template
+        head, sep, tail = template.partition('{path}')
+        if not sep or '{' in tail:
+            head = None
+        self.head = head
+        self.fields = tuple(re.findall(r'{(\w+)}', head)) if head is not None else ()
+        self.tail = tail
+        self._key = itemgetter(*self.fields) if self.fields else lambda options: ()
+        self._heads = {}
+
+    def expand(self, options, path):
+        if self.head is None:
+            values = dict(options)
+            values['path'] = path
+            return self.template.format(**values)
+        key = self._key(options)
+        head = self._heads.get(key)
+        if head is None:
+            head = self._heads[key] = self.head.format(**options)
+        return head + path + self.tail
+
+
+_url_templates = {}
+
+
+def url_template(template):
+    compiled = _url_templates.get(template)
+    if compiled is None:
+        compiled = _url_templates[template] = URLTemplate(template)
+    return compiled
+
+
 def raise_on_error(r, verb='???', **kwargs):
     request = kwargs.get('request', None)
 
@@ -23,29 +70,9 @@ def raise_on_error(r, verb='???', **kwargs):
         raise BitbucketError(None, **kwargs)
 
     if r.status_code >= 400:
-        error = ''
-        if r.status_code == 403 and "x-authentication-denied-reason" in r.headers:
-            error = r.headers["x-authentication-denied-reason"]
-        elif r.text:
-            try:
-                response = json.loads(r.text)
-                if 'message' in response:
-                    error = response['message']
-                elif 'errorMessages' in response and len(response['errorMessages']) > 0:
-                    errorMessages = response['errorMessages']
-                    if isinstance(errorMessages, (list, tuple)):
-                        error = errorMessages[0]
-                    else:
-                        error = errorMessages
-                elif 'errors' in response and len(response['errors']) > 0 and isinstance(response['errors'], dict):
-                    error_list = response['errors'].values()
-                    error = ", ".join(error_list)
-                else:
-                    error = r.text
-            except ValueError:
-                error = r.text
-        raise BitbucketError(
-            r.status_code, error, r.url, request=request, response=r, **kwargs)
+        # The message is only extracted from the body if the error is inspected.
+        raise error_class_for(r.status_code)(
+            r.status_code, None, r.url, request=request, response=r, **kwargs)
     if r.status_code not in [200, 201, 202, 204]:
         raise BitbucketError(r.status_code, request=request, response=r, **kwargs)
     if r.status_code == 200 and len(r.content) == 0 \
@@ -53,11 +80,194 @@ def raise_on_error(r, verb='???', **kwargs):
             and 'AUTHENTICATED_FAILED' in r.headers['X-Seraph-LoginReason']:
         pass
 
+
+def iter_pages(session, url, params=None, page_size=None, prefetch=0, stream=False):
+    """Yield the ``values`` of a paged REST listing one page at a time.
+
+    Follows ``nextPageStart`` until the server reports ``isLastPage``. When
+    the session has a ``prefetch_pool`` and ``prefetch`` is set, the next
+    ``prefetch`` pages are requested while the caller consumes the current
+    one; once a page reports ``isLastPage``, prefetches of later pages that
+    have not been sent yet are dropped. Prefetches never run on the fan-out
+    ``pool``, so listings can be consumed on its workers. With ``stream``
+    each page is a generator decoding ``values`` while the response is still
+    downloading; prefetching is not combined with it.
+    """
+    params = dict(params or {})
+    if page_size is not None:
+        params['limit'] = page_size
+    start = params.pop('start', 0)
+    pool = getattr(session, 'prefetch_pool', None)
+    pending = {}
+    last_pages = []  # offsets of pages seen to be the last one
+
+    def fetch(offset):
+        page_params = dict(params)
+        page_params['start'] = offset
+        r_json = json_loads(session.get(url, params=page_params))
+        if r_json.get('isLastPage', True) or r_json.get('nextPageStart') is None:
+            last_pages.append(offset)
+        return r_json
+
+    def past_end(offset):
+        return bool(last_pages) and offset > min(last_pages)
+
+    def prefetch_page(offset):
+        return None if past_end(offset) else fetch(offset)
+
+    while True:
+        if stream:
+            page_params = dict(params)
+            page_params['start'] = start
+            r_json = {}
+            values = iter_json_array(session.get(url, params=page_params, stream=True), r_json)
+            yield values
+            for _ in values:
+                pass
+        else:
+            r_json = pending.pop(start).get() if start in pending else None
+            if r_json is None:
+                r_json = fetch(start)
+            step = r_json.get('limit') or params.get('limit')
+            if pool is not None and prefetch and step and r_json.get('nextPageStart') is not None \
+                    and not r_json.get('isLastPage', True):
+                for i in range(prefetch):
+                    offset = r_json['nextPageStart'] + i * step
+                    if past_end(offset):
+                        break
+                    if offset not in pending:
+                        pending[offset] = pool.apply_async(prefetch_page, (offset,))
+            yield r_json.get('values', [])
+        if r_json.get('isLastPage', True) or r_json.get('nextPageStart') is None:
+            break
+        start = r_json['nextPageStart']
+
+
+class JSONStreamReader(object):
+    """Decodes JSON values one at a time from an iterable of byte chunks."""
+
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+    NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+    decoder = json.JSONDecoder()
+
+    def __init__(self, chunks, encoding='utf-8'):
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder(encoding)('replace')
+        self.buf = u''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, min_chars=1):
+        """Append at least ``min_chars`` characters (fewer only at the end)."""
+        parts = [self.buf[self.pos:]]
+        self.pos = 0
+        added = 0
+        for chunk in self._chunks:
+            if chunk:
+                parts.append(self._text.decode(chunk))
+                added += len(parts[-1])
+                if added >= min_chars:
+                    break
+        else:
+            parts.append(self._text.decode(b'', True))
+            self.eof = True
+        self.buf = u''.join(parts)
+        return not self.eof
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            self.pos = self.WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                raise ValueError('Unexpected end of JSON stream')
+            self._fill()
+
+    def drain(self):
+        """Read the rest of the chunks, e.g. trailing whitespace after the value."""
+        for _ in self._chunks:
+            pass
+
+    def take(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected %r at offset %d of JSON stream' % (char, self.pos))
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number followed by nothing but number characters may be cut
+                # off by the chunk boundary ("1." or "1.5e") and continue next.
+                if self.eof or not (isinstance(obj, (int, long, float)) and not isinstance(obj, bool)
+                                    and self.NUMBER_TAIL.match(self.buf, end)):
+                    self.pos = end
+                    return obj
+            except ValueError:
+                if self.eof:
+                    raise
+            # Decoding restarts at the value, so the buffered part of it is at
+            # least doubled first; large values then cost linear time.
+            self._fill(len(self.buf) - self.pos)
+
+
+def iter_json_array(r, members, key='values', chunk_size=64 * 1024):
+    """Yield the elements of the top-level ``key`` array of a streamed response.
+
+    The other top-level members are stored in ``members`` as they are read,
+    so they are complete once the generator is exhausted.
+    """
+    reader = JSONStreamReader(r.iter_content(chunk_size), r.encoding or 'utf-8')
+    try:
+        try:
+            reader.peek()
+        except ValueError:
+            return
+        reader.take('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            name = reader.value()
+            reader.take(':')
+            if name == key:
+                reader.take('[')
+                if reader.peek() != ']':
+                    while True:
+                        yield reader.value()
+                        if reader.peek() != ',':
+                            break
+                        reader.take(',')
+                reader.take(']')
+            else:
+                members[name] = reader.value()
+            if reader.peek() != ',':
+                break
+            reader.take(',')
+        reader.take('}')
+        # Reading to the end lets the connection be reused (and recorded).
+        reader.drain()
+    finally:
+        r.close()
+
+
 def json_loads(r):
 #    raise_on_error(r)
+    # Responses shared by coalesced requests are decoded only once.
+    data = getattr(r, 'decoded_json', None)
+    if data is not None:
+        return data
+    hooks = getattr(r, 'instrumentation', None)
+    if hooks is not None:
+        started = time.time()
     try:
-        return r.json()
+        data = jsoncodec.loads(r.content)
     except ValueError:
         if not r.text:
             return {}
         raise
+    if hooks is not None:
+        hooks.decoded(r.url, time.time() - started, len(r.content))
+    r.decoded_json = data
+    return data
@@ -0,0 +1,108 @@
+import json
+import threading
+
+SERVER = 'http://bitbucket.example.com'
+API = SERVER + '/rest/api/1.0/'
+
+
+def links(path):
+    return {'self': [{'href': '%s/%s' % (SERVER, path)}]}
+
+
+def project(key):
+    return {'key': key, 'id': 1, 'name': key, 'links': links('projects/%s' % key)}
+
+
+def repo(slug, project_key):
+    return {'slug': slug, 'id': 1, 'name': slug, 'project': project(project_key),
+            'links': links('projects/%s/repos/%s/browse' % (project_key, slug))}
+
+
+def pull_request(i, slug, project_key, state='OPEN'):
+    ref = {'id': 'refs/heads/feature-%d' % i, 'repository': repo(slug, project_key)}
+    return {'id': i, 'version': 1, 'title': 'Change %d' % i, 'state': state,
+            'fromRef': ref, 'toRef': dict(ref, id='refs/heads/master'),
+            'reviewers': [{'status': 'APPROVED'}],
+            'links': links('projects/%s/repos/%s/pull-requests/%d' % (project_key, slug, i))}
+
+
+def merge_commit(pr_id, serial=None):
+    return {'id': '%040x' % (serial or pr_id), 'displayId': ('%040x' % (serial or pr_id))[:11],
+            'message': 'Merge pull request #%d in PRJ/repo from feature-%d to master' % (pr_id, pr_id)}
+
+
+def paged(values):
+    """A route serving ``values`` (a list, or a callable returning one) in pages."""
+    def route(params):
+        items = values() if callable(values) else values
+        start = int(params.get('start', 0))
+        limit = int(params.get('limit', 25))
+        page = items[start:start + limit]
+        body = {'start': start, 'limit': limit, 'size': len(page), 'values': page,
+                'isLastPage': start + limit >= len(items)}
+        if not body['isLastPage']:
+            body['nextPageStart'] = start + len(page)
+        return body
+    return route
+
+
+def response(status_code=200, body=None, headers=None, url='http://bb/'):
+    """A requests Response with its body already read."""
+    from requests import Response
+    from requests.structures import CaseInsensitiveDict
+    r = Response()
+    r.status_code = status_code
+    r.headers = CaseInsensitiveDict(headers or {})
+    r._content = json.dumps(body).encode('utf-8') if body is not None else b''
+    r._content_consumed = True
+    r.url = url
+    return r
+
+
+class ScriptedReplayer(object):
+    """Session replayer answering requests with ``responses`` in turn."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def replay(self, verb, url, kwargs):
+        self.requests.append((verb, url, kwargs))
+        return self.responses.pop(0)
+
+
+class StubResponse(object):
+    status_code = 200
+
+    def __init__(self, url, body):
+        self.url = url
+        self.headers = {}
+        self.content = json.dumps(body)
+        self.text = self.content
+
+
+class StubSession(object):
+    """Serves requests from ``routes``, a dict of API path -> body or route callable."""
+
+    def __init__(self, routes, **attributes):
+        self.routes = routes
+        self.requests = []
+        self.pool = None
+        self.prefetch_pool = None
+        self.identity_map = None
+        self.store = None
+        self.merge_commit_indexes = {}
+        self._lock = threading.Lock()
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+    def get(self, url, params=None, **kwargs):
+        params = dict(params or {})
+        with self._lock:
+            self.requests.append((url, params))
+        body = self.routes[url[len(API):]]
+        if callable(body):
+            body = body(params)
+        return StubResponse(url, body)
+
+    post = get
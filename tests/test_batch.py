@@ -0,0 +1,37 @@
+import unittest
+from multiprocessing.pool import ThreadPool
+
+from bitbucket.client import Bitbucket
+from bitbucket.resources import Project
+
+from tests.stubs import SERVER, StubSession, project
+
+
+class BatchFetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Bitbucket(SERVER, basic_auth=('admin', 'admin'))
+        self.client._session = StubSession({'projects/A': project('A'),
+                                            'projects/B': project('B')})
+
+    def test_results_in_order(self):
+        results = self.client.get_many([(Project, 'A'), (Project, 'B'), (Project, 'A'),
+                                        (Project, 'C')])
+        self.assertEqual([r.index for r in results], [0, 1, 2, 3])
+        self.assertEqual([r.resource.key for r in results[:3]], ['A', 'B', 'A'])
+        self.assertIsNone(results[3].resource)
+        self.assertIsInstance(results[3].error, KeyError)
+        # Identical references are fetched once.
+        self.assertEqual(len(self.client._session.requests), 3)
+
+    def test_on_a_busy_worker_pool(self):
+        pool = self.client._session.pool = ThreadPool(1)
+        try:
+            result = pool.apply_async(self.client.get_many, ([(Project, 'A'), (Project, 'B')],))
+            self.assertEqual([r.resource.key for r in result.get(10)], ['A', 'B'])
+        finally:
+            pool.terminate()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+from bitbucket.cache import MemoryCache, ResponseCache, SqliteCache
+from bitbucket.resilientsession import ResilientSession
+
+from tests.stubs import ScriptedReplayer, response
+
+BODY = {'values': [1, 2], 'isLastPage': True}
+
+
+class ResponseCacheTest(unittest.TestCase):
+    backend = MemoryCache
+
+    def setUp(self):
+        self.sent = []
+
+    def fetch(self, *responses):
+        responses = list(responses)
+
+        def fetch(headers):
+            self.sent.append(headers)
+            return responses.pop(0)
+        return fetch
+
+    def test_fresh_entries_served_without_request(self):
+        cache = ResponseCache(self.backend(), ttl=60)
+        fetch = self.fetch(response(200, BODY))
+        key = cache.key('http://bb/x', {'a': 1}, 'user')
+        self.assertEqual(cache.get(key, fetch).json(), BODY)
+        self.assertEqual(cache.get(key, fetch).json(), BODY)
+        self.assertEqual((cache.hits, cache.misses, len(self.sent)), (1, 1, 1))
+
+    def test_revalidated_with_304(self):
+        cache = ResponseCache(self.backend(), ttl=0)
+        fetch = self.fetch(response(200, BODY, {'ETag': '"v1"', 'Last-Modified': 'then'}),
+                           response(304))
+        key = cache.key('http://bb/x')
+        cache.get(key, fetch)
+        r = cache.get(key, fetch, {'Accept': 'application/json'})
+        self.assertEqual((r.status_code, r.json()), (200, BODY))
+        self.assertEqual(self.sent[1], {'Accept': 'application/json', 'If-None-Match': '"v1"',
+                                        'If-Modified-Since': 'then'})
+        self.assertEqual(cache.revalidated, 1)
+
+    def test_refetched_without_validators(self):
+        cache = ResponseCache(self.backend(), ttl=0)
+        fetch = self.fetch(response(200, BODY), response(200, {'values': []}))
+        key = cache.key('http://bb/x')
+        cache.get(key, fetch)
+        self.assertEqual(cache.get(key, fetch).json(), {'values': []})
+        self.assertEqual(self.sent, [{}, {}])
+
+    def test_errors_evict(self):
+        cache = ResponseCache(self.backend(), ttl=0)
+        fetch = self.fetch(response(200, BODY, {'ETag': '"v1"'}), response(404), response(200, BODY))
+        key = cache.key('http://bb/x')
+        cache.get(key, fetch)
+        self.assertEqual(cache.get(key, fetch).status_code, 404)
+        cache.get(key, fetch)
+        self.assertEqual(self.sent[2], {})
+
+
+class SqliteResponseCacheTest(ResponseCacheTest):
+    backend = staticmethod(lambda: SqliteCache(':memory:'))
+
+
+class SessionCacheTest(unittest.TestCase):
+
+    def test_304_served_from_cache(self):
+        session = ResilientSession(cache=ResponseCache(ttl=0))
+        session.auth = ('user', 'password')
+        session.replayer = ScriptedReplayer(response(200, BODY, {'ETag': '"v1"'}), response(304))
+        self.assertEqual(session.get('http://bb/x', params={'a': 1}).json(), BODY)
+        r = session.get('http://bb/x', params={'a': 1})
+        self.assertEqual((r.status_code, r.json()), (200, BODY))
+        self.assertEqual(session.replayer.requests[1][2]['headers']['If-None-Match'], '"v1"')
+
+
+if __name__ == '__main__':
+    unittest.main()
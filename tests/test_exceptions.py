@@ -0,0 +1,41 @@
+import time
+import unittest
+from email.utils import formatdate
+
+from bitbucket.exceptions import BitbucketThrottledError, retry_after
+
+
+class FakeResponse(object):
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(retry_after(FakeResponse({'Retry-After': '30'})), 30.0)
+
+    def test_http_date(self):
+        value = formatdate(time.time() + 120, usegmt=True)
+        wait = retry_after(FakeResponse({'Retry-After': value}))
+        self.assertTrue(115 <= wait <= 120, wait)
+
+    def test_date_in_the_past(self):
+        value = formatdate(time.time() - 120, usegmt=True)
+        self.assertEqual(retry_after(FakeResponse({'Retry-After': value})), 0.0)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(retry_after(FakeResponse({})))
+        self.assertIsNone(retry_after(FakeResponse({'Retry-After': 'soon'})))
+        self.assertIsNone(retry_after(None))
+
+    def test_throttled_error(self):
+        value = formatdate(time.time() + 60, usegmt=True)
+        error = BitbucketThrottledError(429, response=FakeResponse({'Retry-After': value}))
+        self.assertTrue(55 <= error.retry_after <= 60, error.retry_after)
+        self.assertIsNone(BitbucketThrottledError(429).retry_after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from bitbucket.recording import ReplayMiss, TrafficRecorder, TrafficReplayer, request_key
+
+from tests.stubs import response
+
+
+class RecordingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'session.rec')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record(self, recorder, url, body, params=None, status=200, verb='GET'):
+        r = response(status, body, {'ETag': '"%s"' % len(recorder._entries)}, url=url)
+        recorder.record(verb, url, {'params': params}, r, 0.25)
+
+    def test_round_trip(self):
+        recorder = TrafficRecorder(self.path)
+        self.record(recorder, 'http://live/rest/api/1.0/projects', {'values': [1]}, {'start': 0})
+        self.record(recorder, 'http://live/rest/api/1.0/projects', {'values': [2]}, {'start': 25})
+        self.record(recorder, 'http://live/rest/api/1.0/projects/X', {'errors': []}, status=404)
+        recorder.close()
+
+        replayer = TrafficReplayer(self.path)
+        # Only the path and query identify a request, not the server.
+        r = replayer.replay('GET', 'http://replay/rest/api/1.0/projects', {'params': {'start': 25}})
+        self.assertEqual((r.status_code, r.json(), r.headers['etag']), (200, {'values': [2]}, '"1"'))
+        r = replayer.replay('GET', 'http://replay/rest/api/1.0/projects/X', {})
+        self.assertEqual(r.status_code, 404)
+        self.assertRaises(ReplayMiss, replayer.replay,
+                          'POST', 'http://replay/rest/api/1.0/projects/X', {})
+        self.assertEqual((replayer.hits, replayer.misses), (2, 1))
+        replayer.close()
+
+    def test_repeated_requests_replayed_in_order(self):
+        recorder = TrafficRecorder(self.path)
+        for version in (1, 2):
+            self.record(recorder, 'http://live/pr', {'version': version})
+        recorder.close()
+        replayer = TrafficReplayer(self.path)
+        versions = [replayer.replay('GET', 'http://live/pr', {}).json()['version'] for _ in range(3)]
+        self.assertEqual(versions, [1, 2, 2])
+        replayer.close()
+
+    def test_unclosed_archive_is_indexed(self):
+        recorder = TrafficRecorder(self.path)
+        self.record(recorder, 'http://live/a', {'a': 1})
+        recorder._file.flush()
+        replayer = TrafficReplayer(self.path)
+        self.assertEqual(replayer.replay('GET', 'http://live/a', {}).json(), {'a': 1})
+        self.assertTrue(os.path.exists(self.path + '.idx'))
+        replayer.close()
+        recorder.close()
+
+    def test_streamed_response_recorded_once_read(self):
+        recorder = TrafficRecorder(self.path)
+        r = response(200, {'values': list(range(100))}, url='http://live/list')
+        recorder.record('GET', 'http://live/list', {'stream': True}, r, 0.1)
+        self.assertEqual(recorder._entries, [])
+        body = b''.join(r.iter_content(7))
+        recorder.close()
+        replayer = TrafficReplayer(self.path)
+        self.assertEqual(replayer.replay('GET', 'http://live/list', {}).content, body)
+        replayer.close()
+
+    def test_request_key(self):
+        self.assertEqual(request_key('get', 'http://a/x', {'b': 1, 'a': 2}),
+                         request_key('GET', 'https://b:8080/x', [('a', 2), ('b', 1)]))
+        self.assertNotEqual(request_key('GET', 'http://a/x'), request_key('POST', 'http://a/x'))
+        self.assertNotEqual(request_key('POST', 'http://a/x', data='{}'),
+                            request_key('POST', 'http://a/x', data='{"a": 1}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import threading
+import time
+import unittest
+
+from bitbucket.resilientsession import ResilientSession
+
+from tests.stubs import response
+
+
+class SlowReplayer(object):
+    """Answers every request with an empty 200 after ``delay`` seconds."""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def replay(self, verb, url, kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return response(200, {}, url=url)
+
+
+class InFlightLimitTest(unittest.TestCase):
+
+    def run_requests(self, session, count=12):
+        threads = [threading.Thread(target=session.get, args=('http://bb/%d' % i,))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_limit(self):
+        session = ResilientSession()
+        session.replayer = SlowReplayer()
+        session.in_flight_limit = threading.BoundedSemaphore(3)
+        self.run_requests(session)
+        self.assertEqual(session.replayer.max_in_flight, 3)
+
+    def test_unlimited(self):
+        session = ResilientSession()
+        session.replayer = SlowReplayer()
+        self.run_requests(session)
+        self.assertGreater(session.replayer.max_in_flight, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
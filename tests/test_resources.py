@@ -0,0 +1,181 @@
+import unittest
+
+from bitbucket.client import Bitbucket
+from bitbucket import resources
+from bitbucket.resources import (Commit, MergeCommitIndex, Project, PullRequest, Repo,
+                                 ResourceResolver, UnknownResource, User, cls_for_resource)
+
+from tests.stubs import API, SERVER, StubSession, merge_commit, paged, project, pull_request, repo
+
+
+class IdentityMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Bitbucket(SERVER, basic_auth=('admin', 'admin'),
+                                options={'identity_map_size': 100})
+        self.client._session = StubSession({
+            'projects': paged([project('PRJ')]),
+            'projects/PRJ': project('PRJ'),
+            'projects/PRJ/repos': paged([repo('repo', 'PRJ')]),
+            'projects/PRJ/repos/repo/pull-requests': paged(
+                [pull_request(i, 'repo', 'PRJ') for i in (1, 2)]),
+        }, identity_map=self.client._session.identity_map)
+
+    def test_listed_resources_are_complete(self):
+        repo_ = self.client.projects()[0].repos()[0]
+        self.assertIsInstance(repo_, Repo)
+        self.assertIsInstance(repo_.project, Project)
+        self.assertEqual(repo_.project.name, 'PRJ')
+
+    def test_listings_share_instances(self):
+        project_ = self.client.projects()[0]
+        self.assertIs(self.client.projects()[0], project_)
+        self.assertIs(self.client.project('PRJ'), project_)
+        self.assertIs(project_.repos()[0].project, project_)
+
+    def test_links_are_not_shared(self):
+        repo_ = self.client.projects()[0].repos()[0]
+        pr = repo_.pull_requests(state='ALL')[0]
+        relisted = repo_.pull_requests(state='ALL')[0]
+        self.assertIs(relisted, pr)
+        self.assertIsInstance(pr, PullRequest)
+        self.assertIsNot(pr.links, pr)
+        self.assertEqual(pr.links.self[0].href,
+                         SERVER + '/projects/PRJ/repos/repo/pull-requests/1')
+        self.assertEqual(pr.fromRef.repository.project.name, 'PRJ')
+
+
+class CanMergeManyTest(unittest.TestCase):
+
+    def test_open_and_merged(self):
+        routes = {
+            'projects/PRJ/repos/repo/commits': paged([merge_commit(2)]),
+            'projects/PRJ/repos/repo/pull-requests/3/merge': {'canMerge': True},
+            'projects/PRJ/repos/repo/pull-requests/4/merge': {
+                'canMerge': False, 'outcome': 'CONFLICTED'},
+        }
+        options = dict(Bitbucket.DEFAULT_OPTIONS, server=SERVER)
+        session = StubSession(routes)
+        repo_ = Repo(options, session, repo('repo', 'PRJ'))
+        prs = [PullRequest(options, session, pull_request(1, 'repo', 'PRJ', 'MERGED')),
+               PullRequest(options, session, pull_request(2, 'repo', 'PRJ', 'MERGED')),
+               PullRequest(options, session, pull_request(3, 'repo', 'PRJ')),
+               PullRequest(options, session, pull_request(4, 'repo', 'PRJ'))]
+        results = repo_.can_merge_many(prs)
+        self.assertEqual(results[1]['commit'], 'Failed to fetch commitID')
+        self.assertEqual(results[2], {'canMerge': False, 'reason': 'Already merged',
+                                      'commit': merge_commit(2)['displayId']})
+        self.assertEqual(results[3], {'canMerge': True, 'reason': ''})
+        self.assertEqual(results[4], {'canMerge': False, 'reason': 'Merge conflicts'})
+        history = [params for url, params in session.requests if url.endswith('/commits')]
+        self.assertEqual(len(history), 1)
+
+
+class MergeCommitIndexTest(unittest.TestCase):
+    COMMITS = 'projects/PRJ/repos/repo/commits'
+
+    def setUp(self):
+        # Merge history, newest first.
+        self.history = [merge_commit(i) for i in (3, 2, 1)]
+        self.session = StubSession({self.COMMITS: paged(lambda: self.history)})
+
+    def index(self, **kwargs):
+        return MergeCommitIndex(self.session, API + self.COMMITS, **kwargs)
+
+    def starts(self):
+        return [params.get('start', 0) for url, params in self.session.requests]
+
+    def test_new_merges_between_lookups(self):
+        index = self.index(refresh_interval=0)
+        self.assertEqual(index.get(2)['id'], merge_commit(2)['id'])
+        self.history[:0] = [merge_commit(5), merge_commit(4)]
+        self.assertEqual(index.get(5)['id'], merge_commit(5)['id'])
+        self.assertEqual(index.get(4)['id'], merge_commit(4)['id'])
+        self.assertEqual(len(self.session.requests), 2)
+
+    def test_pull_request_without_merge_commit(self):
+        index = self.index(refresh_interval=3600)
+        self.assertIsNone(index.get(9))
+        self.assertIsNone(index.get(8))
+        self.assertEqual(len(self.session.requests), 1)
+        # Within the refresh interval new merges are only seen after expire().
+        self.history.insert(0, merge_commit(9))
+        self.assertIsNone(index.get(9))
+        index.expire()
+        self.assertEqual(index.get(9)['id'], merge_commit(9)['id'])
+        self.assertEqual(len(self.session.requests), 2)
+
+    def test_history_longer_than_one_page(self):
+        self.history = [merge_commit(i) for i in range(5, 0, -1)]
+        index = self.index(page_size=2, refresh_interval=0)
+        self.assertIsNotNone(index.get(5))
+        self.assertEqual(self.starts(), [0])
+        # Two new merges shift the unread history down by two.
+        self.history[:0] = [merge_commit(7), merge_commit(6)]
+        self.assertEqual(index.get(1)['id'], merge_commit(1)['id'])
+        self.assertEqual(self.starts(), [0, 0, 2, 4, 6])
+        self.assertIsNotNone(index.get(6))
+        self.assertIsNotNone(index.get(3))
+        self.assertEqual(len(self.session.requests), 5)
+
+    def test_merge_expires_index(self):
+        routes = {self.COMMITS: paged(lambda: self.history),
+                  'projects/PRJ/repos/repo/pull-requests/4/merge': pull_request(4, 'repo', 'PRJ')}
+        options = dict(Bitbucket.DEFAULT_OPTIONS, server=SERVER)
+        session = StubSession(routes)
+        pr = PullRequest(options, session, pull_request(4, 'repo', 'PRJ'))
+        self.assertIsNone(pr.get_merge_commit())
+        self.history.insert(0, merge_commit(4))
+        pr.merge()
+        self.assertEqual(pr.get_merge_commit().id, merge_commit(4)['id'])
+
+
+class ResourceResolverTest(unittest.TestCase):
+    PATTERNS = [('projects/*', Project),
+                ('projects/*/repos/*/browse', Repo),
+                ('projects/*/repos/*/commits/*', Commit),
+                ('projects/*/repos/*/commits/merges', User)]
+
+    def resolver(self, patterns):
+        resolver = ResourceResolver(default=UnknownResource)
+        for pattern, resource_cls in patterns:
+            resolver.register(pattern, resource_cls)
+        return resolver
+
+    def test_precedence_independent_of_order(self):
+        for patterns in (self.PATTERNS, self.PATTERNS[::-1]):
+            resolve = self.resolver(patterns).resolve
+            self.assertIs(resolve(SERVER + '/projects/P'), Project)
+            # Longer patterns win over shorter ones...
+            self.assertIs(resolve(SERVER + '/projects/P/repos/r/browse'), Repo)
+            # ...and literal segments over wildcards.
+            self.assertIs(resolve(SERVER + '/projects/P/repos/r/commits/merges'), User)
+            self.assertIs(resolve(SERVER + '/projects/P/repos/r/commits/abc'), Commit)
+
+    def test_unmatched(self):
+        resolve = self.resolver(self.PATTERNS).resolve
+        self.assertIs(resolve(SERVER + '/projects/P/repos/r'), UnknownResource)
+        self.assertIs(resolve(SERVER + '/projects/'), UnknownResource)
+        self.assertIs(resolve(SERVER + '/projects/P/repos/r/browse?at=master#l1'), Repo)
+
+    def test_register_after_lookup(self):
+        resolver = self.resolver(self.PATTERNS)
+        href = SERVER + '/projects/P/repos/r'
+        self.assertIs(resolver.resolve(href), UnknownResource)
+        resolver.register('projects/*/repos/*', Repo)
+        self.assertIs(resolver.resolve(href), Repo)
+
+    def test_resource_class_map_entries_honoured(self):
+        href = [{'href': SERVER + '/projects/P/repos/r/commits/abc'}]
+        self.assertIs(cls_for_resource(href), UnknownResource)
+        resources.resource_class_map[r'repos/[^/]+/commits/[^/]+$'] = Commit
+        try:
+            self.assertIs(cls_for_resource(href), Commit)
+            self.assertIs(cls_for_resource([{'href': SERVER + '/users/u'}]), User)
+        finally:
+            del resources.resource_class_map[r'repos/[^/]+/commits/[^/]+$']
+        self.assertIs(cls_for_resource(href), UnknownResource)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import logging
+import unittest
+
+from bitbucket.exceptions import BitbucketError, BitbucketThrottledError
+from bitbucket.resilientsession import ResilientSession
+from bitbucket.retry import RetryBudget, RetryPolicy
+
+from tests.stubs import ScriptedReplayer, response
+
+
+class RetryTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.delays = []
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def session(self, *responses, **policy):
+        session = ResilientSession(retry_policy=RetryPolicy(**policy))
+        session.replayer = ScriptedReplayer(*responses)
+        session.sleep = self.delays.append
+        return session
+
+    def test_get_retried_on_503(self):
+        session = self.session(response(503), response(503), response(200, {'ok': 1}),
+                               base_delay=1, max_delay=60)
+        self.assertEqual(session.get('http://bb/x').status_code, 200)
+        self.assertEqual(len(session.replayer.requests), 3)
+        self.assertEqual(len(self.delays), 2)
+        self.assertTrue(1 <= self.delays[0] <= 3, self.delays)
+
+    def test_first_delays_are_jittered(self):
+        policy = RetryPolicy(base_delay=1, max_delay=60)
+        delays = set(policy.delay(0) for _ in range(20))
+        self.assertGreater(len(delays), 1)
+        self.assertTrue(all(1 <= delay <= 3 for delay in delays), delays)
+
+    def test_post_not_retried_on_503(self):
+        session = self.session(response(503), response(200))
+        self.assertRaises(BitbucketError, session.post, 'http://bb/x')
+        self.assertEqual(len(session.replayer.requests), 1)
+        self.assertEqual(self.delays, [])
+
+    def test_post_retried_on_429(self):
+        session = self.session(response(429, headers={'Retry-After': '2'}), response(200))
+        self.assertEqual(session.post('http://bb/x').status_code, 200)
+        self.assertEqual(self.delays, [2.0])
+
+    def test_retry_after_above_max_delay(self):
+        session = self.session(response(429, headers={'Retry-After': '120'}), response(200),
+                               max_delay=60)
+        self.assertRaises(BitbucketThrottledError, session.get, 'http://bb/x')
+        self.assertEqual(len(session.replayer.requests), 1)
+        self.assertEqual(self.delays, [])
+
+    def test_budget_exhausted(self):
+        budget = RetryBudget(ratio=0, min_per_second=0, max_tokens=1)
+        session = self.session(*[response(503)] * 4, budget=budget, base_delay=0)
+        self.assertRaises(BitbucketError, session.get, 'http://bb/x')
+        self.assertEqual(len(session.replayer.requests), 2)
+        self.assertEqual(session.retry_policy.stats()['budget_exhausted'], 1)
+
+    def test_budget_refilled_by_requests(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=1)
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+
+from bitbucket.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def run_concurrently(self, flight, func, count=5):
+        """Call ``func`` for one key from ``count`` threads; return their outcomes."""
+        release = threading.Event()
+        outcomes = []
+
+        def leader():
+            release.wait(10)
+            return func()
+
+        def call():
+            try:
+                outcomes.append(flight.do('key', leader))
+            except Exception as e:
+                outcomes.append(e)
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        deadline = time.time() + 10
+        while flight.stats()['coalesced'] < count - 1 and time.time() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        calls = []
+        outcomes = self.run_concurrently(flight, lambda: calls.append(1) or 'result')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(outcomes), [('result', False)] + [('result', True)] * 4)
+        self.assertEqual(flight.stats(), {'calls': 1, 'coalesced': 4, 'in_flight': 0})
+
+    def test_concurrent_calls_share_exception(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('boom')
+        outcomes = self.run_concurrently(flight, fail)
+        self.assertEqual(len(outcomes), 5)
+        self.assertTrue(all(isinstance(e, ValueError) for e in outcomes), outcomes)
+        self.assertEqual(flight.stats()['calls'], 1)
+
+    def test_sequential_calls_not_cached(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('key', lambda: 1), (1, False))
+        self.assertEqual(flight.do('key', lambda: 2), (2, False))
+        self.assertEqual(flight.stats()['coalesced'], 0)
+
+    def test_key(self):
+        self.assertEqual(SingleFlight.key('u', {'a': 1, 'b': 2}, 'user'),
+                         SingleFlight.key('u', {'b': 2, 'a': 1}, 'user'))
+        self.assertNotEqual(SingleFlight.key('u', None, 'user'),
+                            SingleFlight.key('u', None, 'other'))
+        self.assertNotEqual(SingleFlight.key('u', headers={'Accept': 'a'}),
+                            SingleFlight.key('u', headers={'Accept': 'b'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import unittest
+from multiprocessing.pool import ThreadPool
+
+from bitbucket.utils import JSONStreamReader, iter_json_array, iter_pages
+
+from tests.stubs import API, StubSession, paged
+
+
+class FakeStreamedResponse(object):
+    encoding = 'utf-8'
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    payload = {
+        'size': 6, 'limit': 25, 'isLastPage': False, 'start': 0, 'nextPageStart': 6,
+        'values': [1.5, -2, 3e-05, 12345678901234, 0.25e10,
+                   {'id': 7, 'title': u'caf\xe9 "quoted"', 'open': True, 'parent': None,
+                    'reviewers': [{'user': {'name': 'u1'}, 'approved': False}]}],
+    }
+
+    def decode(self, chunks):
+        members = {}
+        values = list(iter_json_array(FakeStreamedResponse(chunks), members))
+        return values, members
+
+    def test_split_at_every_offset(self):
+        data = json.dumps(self.payload, ensure_ascii=False).encode('utf-8')
+        expected_members = dict((k, v) for k, v in self.payload.items() if k != 'values')
+        for i in range(len(data) + 1):
+            values, members = self.decode([data[:i], data[i:]])
+            self.assertEqual(values, self.payload['values'], 'split at %d' % i)
+            self.assertEqual(members, expected_members, 'split at %d' % i)
+
+    def test_byte_chunks(self):
+        data = json.dumps(self.payload).encode('utf-8')
+        values, _ = self.decode([data[i:i + 1] for i in range(len(data))])
+        self.assertEqual(values, self.payload['values'])
+
+    def test_number_cut_at_chunk_boundary(self):
+        for chunks in ([b'{"values":[1.', b'5]}'], [b'{"values":[1.5e', b'2]}'],
+                       [b'{"values":[1e-', b'3]}'], [b'{"values":[-', b'4]}']):
+            values, _ = self.decode(chunks)
+            self.assertEqual(values, [json.loads(b''.join(chunks))['values'][0]])
+
+    def test_empty_body(self):
+        self.assertEqual(self.decode([]), ([], {}))
+
+    def test_large_value_is_not_redecoded_per_chunk(self):
+        value = {'message': 'x' * 100000, 'parents': [{'id': i} for i in range(5000)]}
+        data = json.dumps(value).encode('utf-8')
+        reader = JSONStreamReader(data[i:i + 1024] for i in range(0, len(data), 1024))
+        attempts = []
+        raw_decode = reader.decoder.raw_decode
+        reader.decoder = json.JSONDecoder()
+        reader.decoder.raw_decode = lambda s, idx: attempts.append(idx) or raw_decode(s, idx)
+        self.assertEqual(reader.value(), value)
+        # ~150 chunks: the buffer doubles between attempts instead of growing by one chunk.
+        self.assertLessEqual(len(attempts), 10)
+
+
+class IterPagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ThreadPool(1)
+        self.session = StubSession({'items': paged(list(range(250)))}, prefetch_pool=self.pool)
+
+    def tearDown(self):
+        self.pool.terminate()
+
+    def listing(self, prefetch):
+        pages = iter_pages(self.session, API + 'items', {}, 30, prefetch)
+        values = [value for page in pages for value in page]
+        # Let prefetches still queued run before requests are counted.
+        self.pool.close()
+        self.pool.join()
+        return values
+
+    def test_without_prefetch(self):
+        self.assertEqual(self.listing(0), list(range(250)))
+        self.assertEqual(len(self.session.requests), 9)
+
+    def test_no_prefetch_past_last_page(self):
+        self.assertEqual(self.listing(4), list(range(250)))
+        starts = sorted(params['start'] for url, params in self.session.requests)
+        self.assertEqual(starts, list(range(0, 250, 30)))
+
+
+if __name__ == '__main__':
+    unittest.main()